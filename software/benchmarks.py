@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from functools import partial
+from types import SimpleNamespace
+
+from metrics import percentile
+from playback import PlaybackEngine
+from recordingstore import RecordingStore
+from transmitter import CommandTransmitter
+from transport import SIM_PREFIX
+from turretcore import TurretLink
+
+BENCHMARKS = ('send', 'joystick', 'playback', 'library', 'console')
+# Metrics where a bigger number is better; every other metric is a cost.
+HIGHER_IS_BETTER = frozenset(('commands_per_second', 'events_per_second', 'lines_per_second'))
+DEFAULT_TOLERANCE = 0.25
+
+
+class FakeSerialTransport:
+    # Stands in for SerialTransport: accepts every write at once and never answers.
+    def __init__(self, port='fake'):
+        self.port = port
+        self.bytes_written = 0
+        self.writes = 0
+        self.closed = False
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        self.writes += 1
+        return len(data)
+
+    async def write_async(self, data):
+        return self.write(data)
+
+    async def read_async(self, size=1024):
+        while not self.closed:
+            await asyncio.sleep(1)
+        return b''
+
+    def is_open(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class BenchLink(TurretLink):
+    def __init__(self, framed=False, **kwargs):
+        super().__init__(telemetry=0, **kwargs)
+        self.fake_framed = framed
+
+    async def open_ready(self, port, timeout):
+        return FakeSerialTransport(port), self.fake_framed
+
+
+async def connected_link(framed=False):
+    link = BenchLink(framed)
+    await link.connect('fake')
+    return link
+
+
+def rate(count, elapsed):
+    return count / elapsed if elapsed > 0 else float('inf')
+
+
+def joystick_events(count):
+    # A drag circling the pad: mostly repeated directions, with a change every few events.
+    directions = ('u', 'ul', 'l', 'dl', 'd', 'dr', 'r', 'ur')
+    return [directions[(i // 5) % len(directions)] for i in range(count)]
+
+
+def tk_root():
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+        return tk, root
+    except Exception as e:
+        return None, str(e)
+
+
+async def bench_send(count):
+    link = await connected_link()
+    events = joystick_events(count)
+    try:
+        # Room for every event, so each one is really queued rather than turned away
+        # once the link's queue is full; nothing runs until the loop gets control back.
+        link.transmitter.maxlen = count
+        started = time.perf_counter()
+        for cmd in events:
+            link.send_nowait(cmd)
+        enqueue = time.perf_counter() - started
+        dropped = link.transmitter.dropped
+        link.transmitter.queue.clear()
+
+        # The transmitter on its own, pacing off, encoding through the link. After the
+        # 'c' the estimate is known, and each cycle runs into the tilt clamp so some
+        # moves change nothing and are suppressed.
+        transport = FakeSerialTransport()
+        transmitter = CommandTransmitter(transport.write_async, maxlen=count + 1, move_interval=0,
+                                         bytes_per_second=float('inf'), encode=link.encode)
+        transmitter.start()
+        cycle = ['c', 'u', 'u', 'u', 'l', 'r', 'd', 'd', 'd', 'd', 's', 'x']
+        commands = cycle * (count // len(cycle))
+        started = time.perf_counter()
+        for cmd in commands:
+            transmitter.send(cmd)
+        await transmitter.drain()
+        elapsed = time.perf_counter() - started
+        await transmitter.stop()
+    finally:
+        await link.disconnect()
+    return {
+        'send_nowait_us': enqueue / count * 1e6,
+        'send_nowait_dropped': dropped,
+        'commands_per_second': rate(transmitter.sent, elapsed),
+        'suppressed_fraction': (transmitter.suppressed / len(commands)) if commands else 0.0,
+    }
+
+
+def open_gui(recordings_dir, port=None):
+    # A real ControllerGUI in a withdrawn window. With port given it connects
+    # through the GUI itself, pumping Tk until the connection is reported.
+    tk, root = tk_root()
+    if tk is None:
+        return None, f"no Tk display: {root}"
+    try:
+        from controllergui import ControllerGUI
+    except ImportError as e:
+        root.destroy()
+        return None, f"cannot import the GUI: {e}"
+    gui = ControllerGUI(root, recordings_dir=recordings_dir)
+    if port is not None:
+        gui.port_entry.set(port)
+        gui.connect()
+        deadline = time.monotonic() + 5
+        while not gui.is_connected and time.monotonic() < deadline:
+            root.update()
+            time.sleep(0.01)
+        if not gui.is_connected:
+            gui.on_closing()
+            return None, f"could not connect to {port}"
+    return gui, None
+
+
+def bench_joystick(count):
+    directory = tempfile.mkdtemp(prefix='turret-bench-')
+    gui, error = open_gui(directory, f"{SIM_PREFIX}bench")
+    if gui is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        return {'skipped': error}
+    rng = random.Random(0)
+    events = [SimpleNamespace(x=rng.randint(0, 200), y=rng.randint(0, 200)) for _ in range(count)]
+    try:
+        started = time.perf_counter()
+        for event in events:
+            gui.move_joystick(event)
+        elapsed = time.perf_counter() - started
+    finally:
+        gui.on_closing()
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'move_joystick_us': elapsed / count * 1e6,
+        'events_per_second': rate(count, elapsed),
+    }
+
+
+async def bench_playback(count, interval):
+    link = await connected_link()
+    # Moves as a live recording has them, one per motion event and far closer
+    # together than the move interval the joystick is held to.
+    moves = ('l', 'l', 'ul', 'u', 'r', 'r', 'dr', 'd')
+    recording = [{'command': moves[i % len(moves)], 'time': i * interval} for i in range(count)]
+    latenesses = []
+    engine = PlaybackEngine(recording, partial(link.send, timed=True), on_command=lambda cmd, lateness: latenesses.append(lateness))
+    try:
+        stats = await engine.run()
+    finally:
+        await link.disconnect()
+    return {
+        'duration_s': count * interval,
+        'mean_lateness_ms': stats['mean_lateness'] * 1000,
+        'p99_lateness_ms': percentile(latenesses, 0.99) * 1000,
+        'max_lateness_ms': stats['max_lateness'] * 1000,
+    }
+
+
+def make_library(directory, count):
+    recording = json.dumps([{'command': 'l', 'time': 0.0}, {'command': 'r', 'time': 0.5}])
+    for i in range(count):
+        with open(os.path.join(directory, f"recording {i:05d}.json"), 'w') as f:
+            f.write(recording)
+
+
+def bench_library(count):
+    directory = tempfile.mkdtemp(prefix='turret-bench-')
+    try:
+        make_library(directory, count)
+
+        started = time.perf_counter()
+        store = RecordingStore(directory)
+        store.refresh()
+        cold = time.perf_counter() - started
+
+        started = time.perf_counter()
+        store = RecordingStore(directory)
+        store.refresh()
+        warm = time.perf_counter() - started
+
+        started = time.perf_counter()
+        store.refresh()
+        unchanged = time.perf_counter() - started
+
+        results = {
+            'files': count,
+            'cold_refresh_ms': cold * 1000,
+            'indexed_refresh_ms': warm * 1000,
+            'unchanged_refresh_ms': unchanged * 1000,
+        }
+        results.update(bench_dropdown(store, directory))
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_dropdown(store, directory):
+    gui, _ = open_gui(directory)
+    if gui is None:
+        started = time.perf_counter()
+        store.names()
+        return {'names_ms': (time.perf_counter() - started) * 1000}
+    try:
+        started = time.perf_counter()
+        gui.update_recording_dropdown()
+        return {'update_dropdown_ms': (time.perf_counter() - started) * 1000}
+    finally:
+        gui.on_closing()
+
+
+def bench_console(count):
+    tk, root = tk_root()
+    if tk is None:
+        return {'skipped': f"no Tk display: {root}"}
+    from consolelog import ConsoleLog
+    text = tk.Text(root)
+    console = ConsoleLog(root, text)
+    results = {}
+    try:
+        message = "Sent command: ul (recorded at 12.34s)"
+        started = time.perf_counter()
+        for _ in range(count):
+            console.log(message)
+        elapsed = time.perf_counter() - started
+        results['log_us'] = elapsed / count * 1e6
+        results['lines_per_second'] = rate(count, elapsed)
+        console.drain()
+
+        # Drain cost as the widget fills up to and past max_lines.
+        for lines in (100, console.max_lines, console.max_lines * 5):
+            for _ in range(lines):
+                console.log(message)
+            started = time.perf_counter()
+            console.drain()
+            results[f'drain_{lines}_ms'] = (time.perf_counter() - started) * 1000
+    finally:
+        console.close()
+        root.destroy()
+    return results
+
+
+def run_all(names, quick):
+    scale = 10 if quick else 1
+    benchmarks = {
+        'send': lambda: asyncio.run(bench_send(100000 // scale)),
+        'joystick': lambda: bench_joystick(20000 // scale),
+        'playback': lambda: asyncio.run(bench_playback(1000 // scale, 0.01)),
+        'library': lambda: bench_library(10000 // scale),
+        'console': lambda: bench_console(100000 // scale),
+    }
+    results = {}
+    for name in names or benchmarks:
+        print(f"{name}...", flush=True)
+        results[name] = benchmarks[name]()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(base, (int, float)) or not base:
+                continue
+            change = (value - base) / abs(base)
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            print(f"  {name}.{metric}: {base:.4g} -> {value:.4g} ({change:+.0%}) {flag}")
+            if flag:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the controller's hot paths against a fake serial port.")
+    parser.add_argument('benchmarks', nargs='*', help=f"any of {', '.join(BENCHMARKS)}; all by default")
+    parser.add_argument('--quick', action='store_true', help="run at a tenth of the size")
+    parser.add_argument('--save', metavar='FILE', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare against a saved baseline; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown allowed before a metric counts as a regression")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        # Quick runs are a tenth of the size, so their numbers are not comparable with full ones.
+        quick = baseline.get('quick', False)
+        if quick != args.quick:
+            parser.error(f"{args.compare} is a {'quick' if quick else 'full'} baseline; "
+                         f"compare {'with' if quick else 'without'} --quick")
+
+    results = run_all(args.benchmarks, args.quick)
+    for name, metrics in results.items():
+        print(f"{name}:")
+        for metric, value in metrics.items():
+            print(f"  {metric}: {value:.4g}" if isinstance(value, float) else f"  {metric}: {value}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'quick': args.quick,
+                'results': results,
+            }, f, indent=2)
+
+    if baseline is not None:
+        print(f"Compared with {args.compare} ({baseline.get('created', 'unknown date')}):")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
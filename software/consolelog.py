@@ -0,0 +1,73 @@
+import logging
+import logging.handlers
+import threading
+import tkinter as tk
+from collections import deque
+
+
+class ConsoleLog:
+    def __init__(self, root, text, max_lines=1000, drain_interval=100, log_file=None,
+                 max_file_bytes=1_000_000, backup_count=3):
+        self.root = root
+        self.text = text
+        self.max_lines = max_lines
+        self.drain_interval = drain_interval
+        # deque.append is atomic, so worker threads can log without a lock; when
+        # the GUI falls behind the oldest pending lines are overwritten.
+        self.pending = deque(maxlen=max_lines)
+        self.lines = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+        self.logger = None
+        if log_file:
+            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_file_bytes,
+                                                           backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.logger = logging.getLogger(f'{__name__}.{id(self)}')
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            self.logger.addHandler(handler)
+
+        self.drain_task = self.root.after(self.drain_interval, self.drain)
+
+    def log(self, message):
+        if len(self.pending) == self.pending.maxlen:
+            with self.lock:
+                self.dropped += 1
+        self.pending.append(message)
+        if self.logger:
+            self.logger.info(message)
+
+    def drain(self):
+        messages = []
+        while self.pending:
+            messages.append(self.pending.popleft())
+
+        if messages:
+            with self.lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                messages.insert(0, f"... {dropped} console lines dropped ...")
+
+            self.text.config(state=tk.NORMAL)
+            self.text.insert(tk.END, '\n'.join(messages) + '\n')
+            self.lines += len(messages)
+            excess = self.lines - self.max_lines
+            if excess > 0:
+                self.text.delete('1.0', f'{excess + 1}.0')
+                self.lines -= excess
+            self.text.see(tk.END)
+            self.text.config(state=tk.DISABLED)
+
+        self.drain_task = self.root.after(self.drain_interval, self.drain)
+
+    def close(self):
+        try:
+            self.root.after_cancel(self.drain_task)
+        except tk.TclError:
+            pass
+        if self.logger:
+            for handler in list(self.logger.handlers):
+                handler.close()
+                self.logger.removeHandler(handler)
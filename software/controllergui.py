@@ -1,38 +1,56 @@
-import serial
+# First, so the startup report includes the imports below.
+import startup
 import time
 import tkinter as tk
-import threading
-import json
-import os
+from tkinter import filedialog, ttk
+import argparse
+
+from consolelog import ConsoleLog
+from firmware import CENTER, LR_MAX, MOVE_INTERVAL, UD_MAX
+from playback import MAX_SPEED, MIN_SPEED
+from transport import SIM_PREFIX, is_serial_error
+from turretcore import CoreThread, TurretCore
+
+# Holding the joystick repeats its direction at a rate that grows with how far
+# it is pushed, up to one move per MOVE_INTERVAL, as fast as the servos can follow.
+HOLD_MIN_RATE = 2.5
+HOLD_MAX_RATE = 1 / MOVE_INTERVAL
+JOYSTICK_THRESHOLD = 20
+STARTUP_STAGES = ('window', 'interactive', 'recordings', 'serial')
 
 
 class ControllerGUI:
-    def __init__(self, root):
+    def __init__(self, root, log_file=None, startup_report=False, port='/dev/tty.DSDTECHHC-05',
+                 recordings_dir="recordings", scan=False):
+        self.startup = {}
+        self.startup_report = startup_report
         self.last_direction = ''
         self.hold_active = False
-        self.hold_interval = 100
+        self.hold_deflection = 0.0
+        self.hold_task = None
 
         self.root = root
         self.root.title("Arduino Servo Controller")
         self.root.geometry("1280x720")
         self.root.resizable(True, True)
+        self.log_file = log_file
 
-        self.port = '/dev/tty.DSDTECHHC-05'
-        self.bluetooth = None
+        self.port = port
+        self.scan = scan
         self.is_connected = False
-        self.connection_thread = None
-
         self.is_recording = False
-        self.recording = []
-        self.playback_thread = None
         self.is_playing = False
-        self.saved_recordings = {}
-        self.recordings_dir = "recordings"
-
-        if not os.path.exists(self.recordings_dir):
-            os.makedirs(self.recordings_dir)
-
-        self.load_recordings()
+        self.is_closing = False
+        self.stats_interval = 500
+        self.estimate_interval = 50
+
+        self.recordings_dir = recordings_dir
+        self.core = TurretCore(self.recordings_dir, listener=self.core_event)
+        self.core_thread = CoreThread(self.core)
+        self.core_thread.start()
+        self.recordings = self.core.recordings
+        self.metrics = self.core.metrics
+        self.recordings_refresh_interval = 5000
 
         self.main_frame = tk.Frame(root, padx=20, pady=20)
         self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -41,10 +59,41 @@ class ControllerGUI:
         self.setup_controls_section()
         self.setup_recording_section()
         self.setup_playback_section()
+        self.setup_stats_section()
         self.setup_console_section()
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.toggle_control_buttons(False)
+        self.update_estimate()
+        self.mark_startup('window')
+        # Everything slow waits until the window is up; the dropdown starts from the saved index.
+        self.root.after_idle(self.window_shown)
+
+    def window_shown(self):
+        self.mark_startup('interactive')
+        self.load_recordings()
+        self.recover_journal()
+        self.run_core(self.core.load_serial_backend(), self.serial_ready, self.serial_unavailable)
+
+    def mark_startup(self, stage):
+        if stage in self.startup:
+            return
+        self.startup[stage] = time.perf_counter() - startup.STARTED
+        if all(stage in self.startup for stage in STARTUP_STAGES):
+            report = "Startup: " + ", ".join(f"{stage} {self.startup[stage] * 1000:.0f} ms" for stage in STARTUP_STAGES)
+            self.log_to_console(report)
+            if self.startup_report:
+                print(report)
+
+    def serial_ready(self, ports):
+        values = [self.port] + [port for port in ports if port != self.port] + [SIM_PREFIX]
+        self.port_entry.config(values=values)
+        self.mark_startup('serial')
+
+    def serial_unavailable(self, e):
+        self.log_to_console(f"Serial support unavailable ({e}); only {SIM_PREFIX} ports will work.")
+        self.port_entry.config(values=[SIM_PREFIX])
+        self.mark_startup('serial')
 
     def setup_connection_section(self):
         self.connection_frame = tk.LabelFrame(self.main_frame, text="Connection", padx=10, pady=10)
@@ -53,7 +102,8 @@ class ControllerGUI:
         self.port_label = tk.Label(self.connection_frame, text="Port:")
         self.port_label.grid(row=0, column=0, padx=5, pady=5)
 
-        self.port_entry = tk.Entry(self.connection_frame, width=20)
+        # Filled with the detected serial ports once pyserial has loaded.
+        self.port_entry = ttk.Combobox(self.connection_frame, width=20, values=[self.port])
         self.port_entry.insert(0, self.port)
         self.port_entry.grid(row=0, column=1, padx=5, pady=5)
 
@@ -67,6 +117,11 @@ class ControllerGUI:
         self.status_label = tk.Label(self.connection_frame, text="Status: Disconnected", fg="red")
         self.status_label.grid(row=0, column=4, padx=5, pady=5)
 
+        # Also tries every other serial port at once; the first turret to answer wins.
+        self.scan_var = tk.BooleanVar(value=self.scan)
+        self.scan_check = tk.Checkbutton(self.connection_frame, text="Scan ports", variable=self.scan_var)
+        self.scan_check.grid(row=0, column=5, padx=5, pady=5)
+
     def setup_recording_section(self):
         self.recording_frame = tk.LabelFrame(self.main_frame, text="Recording Controls", padx=10, pady=10)
         self.recording_frame.pack(fill=tk.X, pady=10)
@@ -106,6 +161,16 @@ class ControllerGUI:
                                               100 + self.handle_radius, 100 + self.handle_radius, fill="red",
                                               outline="black", width=2)
 
+        # Estimated turret position (blue ring) and its target (small dot), drawn over the pad.
+        self.marker_radius = 6
+        self.target_marker = self.canvas.create_oval(0, 0, 0, 0, fill="blue", outline="", state=tk.HIDDEN)
+        self.position_marker = self.canvas.create_oval(0, 0, 0, 0, outline="blue", width=2, state=tk.HIDDEN)
+        # Position the turret last reported over telemetry, when it sends any.
+        self.measured_marker = self.canvas.create_oval(0, 0, 0, 0, outline="green", width=2, state=tk.HIDDEN)
+        self.estimate_var = tk.StringVar(self.root, value="Pan --   Tilt --")
+        self.estimate_label = tk.Label(self.joystick_frame, textvariable=self.estimate_var)
+        self.estimate_label.pack(pady=5)
+
         self.canvas.bind("<Button-1>", self.start_move)
         self.canvas.bind("<B1-Motion>", self.move_joystick)
         self.canvas.bind("<ButtonRelease-1>", self.reset_joystick)
@@ -175,6 +240,98 @@ class ControllerGUI:
         self.loop_check = tk.Checkbutton(self.playback_frame, text="Loop Playback", fg="white", variable=self.loop_var)
         self.loop_check.grid(row=0, column=5, padx=5, pady=5)
 
+        self.speed_label = tk.Label(self.playback_frame, text="Speed:", fg="white")
+        self.speed_label.grid(row=0, column=6, padx=5, pady=5)
+
+        self.speed_var = tk.StringVar(self.root, value="1.0")
+        self.speed_spinbox = tk.Spinbox(self.playback_frame, from_=MIN_SPEED, to=MAX_SPEED, increment=0.25,
+                                        textvariable=self.speed_var, width=5, fg="black", bg="white")
+        self.speed_spinbox.grid(row=0, column=7, padx=5, pady=5)
+
+    def setup_stats_section(self):
+        self.stats_frame = tk.LabelFrame(self.main_frame, text="Statistics", padx=10, pady=10)
+        self.stats_frame.pack(fill=tk.X, pady=10)
+
+        self.stats_var = tk.StringVar(self.root)
+        self.stats_label = tk.Label(self.stats_frame, textvariable=self.stats_var, anchor="w", justify=tk.LEFT)
+        self.stats_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+        self.export_csv_button = tk.Button(self.stats_frame, text="Export CSV", fg="black",
+                                           command=self.export_metrics_csv, width=15)
+        self.export_csv_button.grid(row=0, column=1, padx=5, pady=5)
+
+        self.export_prometheus_button = tk.Button(self.stats_frame, text="Export Prometheus", fg="black",
+                                                  command=self.export_metrics_prometheus, width=15)
+        self.export_prometheus_button.grid(row=0, column=2, padx=5, pady=5)
+
+        self.update_stats()
+
+    def update_stats(self):
+        stats = self.metrics.snapshot()
+        self.stats_var.set(
+            f"{stats['commands_per_second']:.1f} cmd/s   "
+            f"{stats['bytes_per_second']:.0f} B/s ({stats['link_utilization']:.1%} of link)   "
+            f"queue {stats['queue_depth']} (max {stats['max_queue_depth']})   "
+            f"latency p50 {stats['latency_p50'] * 1000:.1f} ms / p95 {stats['latency_p95'] * 1000:.1f} ms   "
+            f"write {stats['write_mean'] * 1000:.2f} ms (max {stats['write_max'] * 1000:.2f})   "
+            f"playback lateness {stats['lateness_mean'] * 1000:.2f} ms   "
+            f"motion latency {stats['motion_latency_mean'] * 1000:.0f} ms   "
+            f"turret loop max {stats['max_loop_time'] * 1000:.0f} ms")
+        self.root.after(self.stats_interval, self.update_stats)
+
+    def canvas_point(self, ud, lr):
+        # Screen left sends 'l', which raises lrPos; screen up sends 'u', which lowers udPos.
+        reach = self.base_radius - self.handle_radius
+        x = 100 - (lr - CENTER) / (LR_MAX - CENTER) * reach
+        y = 100 + (ud - CENTER) / (UD_MAX - CENTER) * reach
+        return x, y
+
+    def place_marker(self, marker, ud, lr, radius):
+        x, y = self.canvas_point(ud, lr)
+        self.canvas.coords(marker, x - radius, y - radius, x + radius, y + radius)
+        self.canvas.itemconfig(marker, state=tk.NORMAL)
+        self.canvas.tag_raise(marker)
+
+    def update_estimate(self):
+        if self.is_connected:
+            estimate = self.core.link.estimator.estimate()
+            self.place_marker(self.target_marker, estimate['target_ud'], estimate['target_lr'], 3)
+            self.place_marker(self.position_marker, estimate['ud_pos'], estimate['lr_pos'], self.marker_radius)
+            spin = "on" if estimate['spin_on'] else "off"
+            text = (f"Pan {estimate['lr_pos']}°   Tilt {estimate['ud_pos']}°   Spin {spin}   "
+                    f"({estimate['suppressed']} no-op commands skipped)")
+            status = self.core.link.status
+            if status is not None:
+                self.place_marker(self.measured_marker, status['ud_pos'], status['lr_pos'], self.marker_radius + 3)
+                text += (f"\nMeasured: pan {status['lr_pos']}°   tilt {status['ud_pos']}°   "
+                         f"pot {status['pot']}   loop {status['loop_ms']} ms")
+            self.estimate_var.set(text)
+        self.root.after(self.estimate_interval, self.update_estimate)
+
+    def hide_estimate(self):
+        self.canvas.itemconfig(self.target_marker, state=tk.HIDDEN)
+        self.canvas.itemconfig(self.position_marker, state=tk.HIDDEN)
+        self.canvas.itemconfig(self.measured_marker, state=tk.HIDDEN)
+        self.estimate_var.set("Pan --   Tilt --")
+
+    def export_metrics_csv(self):
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if path:
+            try:
+                self.metrics.export_csv(path)
+                self.log_to_console(f"Metrics exported to {path}")
+            except Exception as e:
+                self.log_to_console(f"Error exporting metrics: {e}")
+
+    def export_metrics_prometheus(self):
+        path = filedialog.asksaveasfilename(defaultextension=".prom", filetypes=[("Prometheus", "*.prom")])
+        if path:
+            try:
+                self.metrics.export_prometheus(path)
+                self.log_to_console(f"Metrics exported to {path}")
+            except Exception as e:
+                self.log_to_console(f"Error exporting metrics: {e}")
+
     def setup_console_section(self):
         self.console_frame = tk.LabelFrame(self.main_frame, text="Console", padx=10, pady=10)
         self.console_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -182,6 +339,7 @@ class ControllerGUI:
         self.console = tk.Text(self.console_frame, height=5, width=50)
         self.console.pack(fill=tk.BOTH, expand=True)
         self.console.config(state=tk.DISABLED)
+        self.console_log = ConsoleLog(self.root, self.console, log_file=self.log_file)
 
     def toggle_spin(self):
         if not hasattr(self, 'spin_on') or not self.spin_on:
@@ -214,38 +372,74 @@ class ControllerGUI:
         self.play_button.config(state=state_value)
         self.delete_button.config(state=state_value)
         self.loop_check.config(state=state_value)
+        self.speed_spinbox.config(state=state_value)
 
     def log_to_console(self, message):
-        self.console.config(state=tk.NORMAL)
-        self.console.insert(tk.END, message + "\n")
-        self.console.see(tk.END)
-        self.console.config(state=tk.DISABLED)
+        self.console_log.log(message)
+
+    def run_core(self, coro, on_success=None, on_failure=None):
+        def done(future):
+            if self.is_closing or future.cancelled():
+                return
+            e = future.exception()
+            if e is not None:
+                if on_failure:
+                    self.root.after(0, lambda: on_failure(e))
+            elif on_success:
+                self.root.after(0, lambda: on_success(future.result()))
+
+        self.core_thread.submit(coro).add_done_callback(done)
+
+    def core_event(self, event, data):
+        # Called on the core's event loop thread; only thread-safe calls from here.
+        if self.is_closing:
+            return
+        if event == 'sent':
+            if self.is_playing and data['recorded_at'] is None:
+                # Already logged with its lateness by the 'playback' event.
+                return
+            if data['recorded_at'] is not None:
+                self.log_to_console(f"Sent command: {data['command']} (recorded at {data['recorded_at']:.2f}s)")
+            else:
+                self.log_to_console(f"Sent command: {data['command']}")
+        elif event == 'playback':
+            self.log_to_console(f"Playback: {data['command']} ({data['lateness'] * 1000:+.1f} ms)")
+        elif event == 'error':
+            self.log_to_console(data['message'])
+        elif event == 'disconnected':
+            self.root.after(0, self.connection_closed)
+        elif event == 'reconnecting':
+            self.log_to_console(f"{data['message']}. Reconnecting; commands are kept until the link is back.")
+            self.root.after(0, lambda: self.status_label.config(text="Status: Reconnecting...", fg="orange"))
+        elif event == 'reconnected':
+            self.log_to_console(f"Reconnected to {data['port']} after {data['downtime']:.2f}s.")
+            self.root.after(0, lambda: self.status_label.config(text="Status: Connected", fg="green"))
 
     def connect(self):
         port = self.port_entry.get()
-        self.connection_thread = threading.Thread(target=self.connect_thread, args=(port,))
-        self.connection_thread.daemon = True
-        self.connection_thread.start()
-
-    def connect_thread(self, port):
-        try:
-            self.log_to_console(f"Connecting to {port}...")
-            self.bluetooth = serial.Serial(port, 9600, timeout=5)
-            time.sleep(1)
-            self.root.after(0, self.connection_successful)
-        except serial.SerialException as e:
-            self.root.after(0, lambda: self.connection_failed(f"Serial port error: {e}"))
-        except FileNotFoundError:
-            self.root.after(0, lambda: self.connection_failed(f"Error: Serial port '{port}' not found."))
-        except Exception as e:
-            self.root.after(0, lambda: self.connection_failed(f"An unexpected error occurred: {e}"))
+        self.core.link.scan = self.scan_var.get()
+        self.log_to_console(f"Connecting to {port}{' (scanning all ports)' if self.core.link.scan else ''}...")
+        self.run_core(self.core.connect(port, timeout=5),
+                      lambda _: self.connection_successful(),
+                      lambda e: self.connection_error(port, e))
+
+    def connection_error(self, port, e):
+        if is_serial_error(e):
+            self.connection_failed(f"Serial port error: {e}")
+        elif isinstance(e, FileNotFoundError):
+            self.connection_failed(f"Error: Serial port '{port}' not found.")
+        else:
+            self.connection_failed(f"An unexpected error occurred: {e}")
 
     def connection_successful(self):
         self.is_connected = True
         self.status_label.config(text="Status: Connected", fg="green")
         self.connect_button.config(state=tk.DISABLED)
         self.disconnect_button.config(state=tk.NORMAL)
+        # A scan may have found the turret on another port.
+        self.port_entry.set(self.core.link.port)
         self.port_entry.config(state=tk.DISABLED)
+        self.scan_check.config(state=tk.DISABLED)
         self.toggle_control_buttons(True)
         self.toggle_recording_buttons(True)
         self.log_to_console("Bluetooth connected successfully.")
@@ -256,53 +450,30 @@ class ControllerGUI:
         self.status_label.config(text="Status: Connection Failed", fg="red")
 
     def disconnect(self):
-        if self.is_connected and self.bluetooth is not None:
-            try:
-                self.bluetooth.close()
-                self.log_to_console("Bluetooth connection closed.")
-            except Exception as e:
-                self.log_to_console(f"Error closing connection: {e}")
-            self.is_connected = False
-            self.status_label.config(text="Status: Disconnected", fg="red")
-            self.connect_button.config(state=tk.NORMAL)
-            self.disconnect_button.config(state=tk.DISABLED)
-            self.port_entry.config(state=tk.NORMAL)
-            self.toggle_control_buttons(False)
-            self.reset_joystick()
-
-    def send_command(self, cmd):
-        if self.is_connected and self.bluetooth is not None:
-            try:
-                self.bluetooth.write(cmd.encode())
-                self.log_to_console(f"Sent command: {cmd}")
-                if self.is_recording:
-                    timestamp = time.time()
-                    if not self.recording:
-                        self.recording_start_time = timestamp
-                        relative_time = 0
-                    else:
-                        relative_time = timestamp - self.recording_start_time
-                    self.recording.append({'command': cmd, 'time': relative_time})
-                    self.log_to_console(f"Recorded command: {cmd} at {relative_time:.2f}s")
-            except Exception as e:
-                self.log_to_console(f"Error sending command: {e}")
-                self.disconnect()
+        if self.is_connected:
+            self.run_core(self.core.disconnect())
+
+    def connection_closed(self):
+        self.log_to_console("Bluetooth connection closed.")
+        self.is_connected = False
+        self.status_label.config(text="Status: Disconnected", fg="red")
+        self.connect_button.config(state=tk.NORMAL)
+        self.disconnect_button.config(state=tk.DISABLED)
+        self.port_entry.config(state=tk.NORMAL)
+        self.scan_check.config(state=tk.NORMAL)
+        self.toggle_control_buttons(False)
+        self.reset_joystick()
+        self.hide_estimate()
+
+    def send_command(self, cmd, replace=False):
+        if self.is_connected:
+            self.core_thread.call(self.core.send_nowait, cmd, replace)
         else:
             self.log_to_console("Not connected. Cannot send command.")
 
     def send_diagonal(self, direction):
-        if direction == 'ul':
-            self.send_command('u')
-            self.send_command('l')
-        elif direction == 'ur':
-            self.send_command('u')
-            self.send_command('r')
-        elif direction == 'dl':
-            self.send_command('d')
-            self.send_command('l')
-        elif direction == 'dr':
-            self.send_command('d')
-            self.send_command('r')
+        if direction in ('ul', 'ur', 'dl', 'dr'):
+            self.send_command(direction)
 
     def reset_position(self):
         self.send_command('c')
@@ -318,11 +489,7 @@ class ControllerGUI:
                            100 + self.handle_radius)
         self.last_direction = ''
         self.hold_active = False
-        if hasattr(self, 'repeat_task'):
-            try:
-                self.root.after_cancel(self.repeat_task)
-            except:
-                pass
+        self.cancel_hold()
 
     def move_joystick(self, event):
         center_x, center_y = 100, 100
@@ -343,7 +510,7 @@ class ControllerGUI:
         current_y = (coords[1] + coords[3]) / 2
         self.canvas.move(self.handle, new_x - current_x, new_y - current_y)
 
-        threshold = 20
+        threshold = JOYSTICK_THRESHOLD
         direction = ''
         if dy < -threshold:
             direction += 'u'
@@ -354,83 +521,102 @@ class ControllerGUI:
         elif dx > threshold:
             direction += 'r'
 
+        # 0 at the edge of the dead zone, 1 at full throw.
+        reach = self.base_radius - self.handle_radius
+        self.hold_deflection = max(0.0, min(1.0, (min(distance, reach) - threshold) / (reach - threshold)))
+
+        # Motion events only change what is held; hold_tick does the sending.
         if direction != self.last_direction:
             self.last_direction = direction
-            if direction:
-                self.send_command(direction)
             self.hold_active = bool(direction)
-
-        self.send_command(direction)
+            self.cancel_hold()
+            if direction:
+                self.hold_tick()
 
     def toggle_recording(self):
         if not self.is_recording:
-            self.is_recording = True
-            self.recording = []
-            self.recording_start_time = time.time()
-            self.record_button.config(text="Stop Recording", bg="darkred")
-            self.save_button.config(state=tk.DISABLED)
-            self.log_to_console("Recording started. Move the joystick or press buttons.")
+            self.run_core(self.core.start_recording(), lambda _: self.recording_started(),
+                          lambda e: self.log_to_console(f"Error starting recording: {e}"))
         else:
-            self.is_recording = False
-            self.record_button.config(text="Start Recording", bg="red")
-            self.save_button.config(state=tk.NORMAL)
-            self.log_to_console(f"Recording stopped. {len(self.recording)} commands recorded.")
+            self.run_core(self.core.stop_recording(), self.recording_stopped,
+                          lambda e: self.log_to_console(f"Error stopping recording: {e}"))
 
-    def save_recording(self):
-        if not self.recording:
-            self.log_to_console("Nothing to save. Recording is empty.")
-            return
+    def recording_started(self):
+        self.is_recording = True
+        self.record_button.config(text="Stop Recording", bg="darkred")
+        self.save_button.config(state=tk.DISABLED)
+        self.log_to_console("Recording started. Move the joystick or press buttons.")
+
+    def recording_stopped(self, count):
+        self.is_recording = False
+        self.record_button.config(text="Start Recording", bg="red")
+        self.save_button.config(state=tk.NORMAL)
+        self.log_to_console(f"Recording stopped. {count} commands recorded.")
+
+    def recover_journal(self):
+        self.run_core(self.core.recover_journal(), self.journal_recovered,
+                      lambda e: self.log_to_console(f"Error recovering unsaved recording: {e}"))
+
+    def journal_recovered(self, name):
+        if name:
+            self.log_to_console(f"Recovered unsaved recording as '{name}'.")
+            self.update_recording_dropdown()
 
+    def save_recording(self):
         name = self.save_name_entry.get().strip()
         if not name:
             self.log_to_console("Please enter a name for the recording.")
             return
 
-        self.saved_recordings[name] = self.recording
+        self.run_core(self.core.save_recording(name), lambda count: self.recording_saved(name, count),
+                      self.save_failed)
 
-        try:
-            filepath = os.path.join(self.recordings_dir, f"{name}.json")
-            with open(filepath, 'w') as f:
-                json.dump(self.recording, f, indent=2)
-            self.log_to_console(f"Recording '{name}' saved successfully with {len(self.recording)} commands.")
-            self.save_button.config(state=tk.DISABLED)
-            self.update_recording_dropdown()
-        except Exception as e:
+    def recording_saved(self, name, count):
+        self.log_to_console(f"Recording '{name}' saved successfully with {count} commands.")
+        self.save_button.config(state=tk.DISABLED)
+        self.update_recording_dropdown()
+
+    def save_failed(self, e):
+        if isinstance(e, ValueError):
+            self.log_to_console(str(e))
+        else:
             self.log_to_console(f"Error saving recording: {e}")
 
     def load_recordings(self):
-        try:
-            if not os.path.exists(self.recordings_dir):
-                return
+        # The scan runs on the core's executor so a large library never stalls the window.
+        self.run_core(self.core.refresh_recordings(), self.recordings_loaded, self.recordings_failed)
+
+    def recordings_loaded(self, result):
+        changed, errors = result
+        for name, e in errors:
+            self.log_to_console(f"Error loading recording {name}: {e}")
+        if changed:
+            self.update_recording_dropdown()
+        self.mark_startup('recordings')
+        self.root.after(self.recordings_refresh_interval, self.load_recordings)
 
-            for filename in os.listdir(self.recordings_dir):
-                if filename.endswith('.json'):
-                    name = filename[:-5]
-                    filepath = os.path.join(self.recordings_dir, filename)
-                    try:
-                        with open(filepath, 'r') as f:
-                            self.saved_recordings[name] = json.load(f)
-                    except Exception as e:
-                        self.log_to_console(f"Error loading recording {name}: {e}")
-        except Exception as e:
-            self.log_to_console(f"Error scanning recordings directory: {e}")
+    def recordings_failed(self, e):
+        self.log_to_console(f"Error scanning recordings directory: {e}")
+        self.mark_startup('recordings')
+        self.root.after(self.recordings_refresh_interval, self.load_recordings)
 
     def update_recording_dropdown(self):
         menu = self.recording_dropdown["menu"]
         menu.delete(0, "end")
 
-        recordings = sorted(list(self.saved_recordings.keys()))
+        recordings = self.recordings.names()
         if recordings:
             for name in recordings:
                 menu.add_command(label=name, command=lambda n=name: self.recording_var.set(n))
-            self.recording_var.set(recordings[0])
+            if self.recording_var.get() not in self.recordings:
+                self.recording_var.set(recordings[0])
         else:
             menu.add_command(label="No recordings available")
             self.recording_var.set("")
 
     def play_recording(self):
         name = self.recording_var.get()
-        if not name or name not in self.saved_recordings:
+        if not name or name not in self.recordings:
             self.log_to_console("No recording selected or recording not found.")
             return
 
@@ -438,108 +624,93 @@ class ControllerGUI:
             self.log_to_console("Already playing a recording.")
             return
 
-        self.log_to_console(f"Playing recording: {name}")
+        try:
+            speed = float(self.speed_var.get())
+        except ValueError:
+            speed = None
+        if speed is None or not MIN_SPEED <= speed <= MAX_SPEED:
+            self.log_to_console(f"Invalid playback speed: enter a value between {MIN_SPEED} and {MAX_SPEED}.")
+            return
+
+        self.log_to_console(f"Playing recording: {name} at {speed:g}x")
         self.is_playing = True
         self.play_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
         self.record_button.config(state=tk.DISABLED)
+        self.run_core(self.core.play(name, speed=speed, loop=self.loop_var.get()),
+                      self.playback_completed, self.playback_failed)
 
-        self.playback_thread = threading.Thread(target=self.playback_thread_func, args=(name,))
-        self.playback_thread.daemon = True
-        self.playback_thread.start()
-
-    def playback_thread_func(self, name):
-        recording = self.saved_recordings.get(name, [])
-        loop = self.loop_var.get()
-
-        try:
-            while self.is_playing:
-                if recording:
-                    last_time = 0
-                    for cmd_data in recording:
-                        if not self.is_playing:
-                            break
-
-                        cmd_time = cmd_data['time']
-                        delay = cmd_time - last_time
-                        if delay > 0:
-                            time.sleep(delay)
-
-                        cmd = cmd_data['command']
-                        self.root.after(0, lambda c=cmd: self.send_command_from_playback(c))
-
-                        last_time = cmd_time
-
-                    if not loop:
-                        break
-                else:
-                    break
-
-            self.root.after(0, self.playback_completed)
-
-        except Exception as e:
-            self.root.after(0, lambda: self.log_to_console(f"Playback error: {e}"))
-            self.root.after(0, self.playback_completed)
-
-    def send_command_from_playback(self, cmd):
-        if self.is_connected and self.bluetooth is not None:
-            try:
-                self.bluetooth.write(cmd.encode())
-                self.log_to_console(f"Playback: {cmd}")
-            except Exception as e:
-                self.log_to_console(f"Error during playback: {e}")
-                self.stop_playback()
-
-    def playback_completed(self):
+    def playback_finished(self):
         self.is_playing = False
         self.play_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.record_button.config(state=tk.NORMAL)
-        self.log_to_console("Playback completed.")
+
+    def playback_completed(self, stats):
+        self.playback_finished()
+        self.log_to_console(f"Playback completed. {stats['commands']} commands, "
+                            f"mean lateness {stats['mean_lateness'] * 1000:.2f} ms, "
+                            f"max {stats['max_lateness'] * 1000:.2f} ms.")
+
+    def playback_failed(self, e):
+        self.playback_finished()
+        self.log_to_console(f"Playback error: {e}")
 
     def stop_playback(self):
         if self.is_playing:
             self.is_playing = False
+            self.core_thread.call(self.core.stop_playback)
             self.log_to_console("Stopping playback...")
             self.reset_position()
 
     def delete_recording(self):
         name = self.recording_var.get()
-        if not name or name not in self.saved_recordings:
+        if not name or name not in self.recordings:
             self.log_to_console("No recording selected or recording not found.")
             return
 
-        if name in self.saved_recordings:
-            del self.saved_recordings[name]
-
         try:
-            filepath = os.path.join(self.recordings_dir, f"{name}.json")
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            self.recordings.delete(name)
             self.log_to_console(f"Recording '{name}' deleted.")
             self.update_recording_dropdown()
         except Exception as e:
             self.log_to_console(f"Error deleting recording: {e}")
 
-    def repeat_command(self, direction):
-        if self.hold_active and direction == self.last_direction:
-            self.send_command(direction)
-            interval = int(
-                self.hold_interval * (1.5 if hasattr(self, 'first_repeat') and not self.first_repeat else 1.0))
-            self.first_repeat = False
-            self.repeat_task = self.root.after(interval, lambda: self.repeat_command(direction))
+    def hold_interval(self):
+        rate = HOLD_MIN_RATE + (HOLD_MAX_RATE - HOLD_MIN_RATE) * self.hold_deflection
+        return int(1000 / rate)
 
-    def schedule_repeat(self):
-        if self.hold_active and self.last_direction:
-            self.send_command(self.last_direction)
+    def hold_tick(self):
+        # The one repeat timer: sends the held direction, then reschedules itself.
+        self.hold_task = None
+        if not self.hold_active or not self.last_direction:
+            return
+        self.send_command(self.last_direction, replace=True)
+        if self.is_connected:
+            self.hold_task = self.root.after(self.hold_interval(), self.hold_tick)
+
+    def cancel_hold(self):
+        if self.hold_task is not None:
+            self.root.after_cancel(self.hold_task)
+            self.hold_task = None
 
     def on_closing(self):
-        if self.is_connected:
-            self.disconnect()
+        self.is_closing = True
+        try:
+            self.core_thread.stop()
+        except Exception as e:
+            print(f"Error shutting down controller: {e}")
+        self.console_log.close()
         self.root.destroy()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bubble turret controller")
+    parser.add_argument('--log-file', help="also write the console to this rotating log file")
+    parser.add_argument('--startup-report', action='store_true', help="print startup timings once loading is done")
+    parser.add_argument('--scan', action='store_true', help="start with port scanning on")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = ControllerGUI(root)
+    app = ControllerGUI(root, log_file=args.log_file, startup_report=args.startup_report, scan=args.scan)
     root.mainloop()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from firmware import TurretModel, effective_state
+
+# Absolute commands are always sent: they cost one byte and put the turret back
+# in a known state if the estimate has drifted from reality.
+ABSOLUTE_CHARS = frozenset('cxs')
+
+
+class TurretEstimator:
+    # Tracks where the turret is pointing by running every command that goes out
+    # through the firmware model against the wall clock. The event loop feeds it
+    # and the GUI reads it, hence the lock.
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # The model starts centered with spin off, as after a boot, but a turret we
+        # connect to may have been moved by an earlier session. Until a 'c' or a
+        # status sync pins the position down, nothing is suppressed.
+        with self.lock:
+            self.model = TurretModel()
+            self.start = self.clock()
+            self.suppressed = 0
+            self.known = False
+
+    def now_ms(self):
+        return (self.clock() - self.start) * 1000
+
+    def apply(self, cmd):
+        # Feeds cmd into the model and returns the part of it that can move the
+        # turret; characters that would not change the effective state are dropped.
+        kept = ''
+        with self.lock:
+            model = self.model
+            model.advance(self.now_ms())
+            for char in cmd:
+                before = (model.target_ud, model.target_lr, model.spin_on)
+                state = effective_state(model)
+                model.feed(char)
+                if char == 'c':
+                    self.known = True
+                if not self.known or char in ABSOLUTE_CHARS or effective_state(model) != state:
+                    kept += char
+                else:
+                    model.target_ud, model.target_lr, model.spin_on = before
+                    self.suppressed += 1
+        return kept
+
+    def sync(self, ud_pos, lr_pos, spin_on):
+        # Takes a measured, settled position from telemetry as the new truth.
+        with self.lock:
+            model = self.model
+            model.advance(self.now_ms())
+            model.ud_pos = model.target_ud = ud_pos
+            model.lr_pos = model.target_lr = lr_pos
+            model.spin_on = spin_on
+            self.known = True
+
+    def doubt(self):
+        # Keeps the model's targets but suppresses nothing until a 'c', a sync or a
+        # position frame confirms them, e.g. after the link dropped.
+        with self.lock:
+            self.known = False
+
+    def confirm(self):
+        # The turret has been sent the model's targets outright, e.g. in a position frame.
+        with self.lock:
+            self.known = True
+
+    def targets(self):
+        with self.lock:
+            return self.model.target_ud, self.model.target_lr, self.model.spin_on
+
+    def estimate(self):
+        with self.lock:
+            model = self.model
+            model.advance(self.now_ms())
+            return {
+                'ud_pos': model.ud_pos,
+                'lr_pos': model.lr_pos,
+                'target_ud': model.target_ud,
+                'target_lr': model.target_lr,
+                'spin_on': model.spin_on,
+                'moving': (model.ud_pos, model.lr_pos) != effective_state(model)[:2],
+                'suppressed': self.suppressed,
+                'known': self.known,
+            }
@@ -0,0 +1,188 @@
+# Constants and a step-accurate Python model of motorcontroller.ino.
+
+from protocol import (FLAG_SPIN, FRAME_LENGTH, FRAME_START, HELLO, HELLO_LENGTH, MAX_DATA, PROTOCOL_VERSION,
+                      SEQ_MODULO, TELEMETRY, TELEMETRY_LENGTH, TELEMETRY_UNIT_MS, checksum, status)
+
+BAUD_RATE = 9600
+BYTES_PER_SECOND = BAUD_RATE / 10  # 8N1: start + 8 data + stop bits per byte
+# Link timing is counted in whole units of 1/LINK_UNITS s, in which a byte takes
+# exactly BYTE_UNITS and a millisecond exactly UNITS_PER_MS, so arrivals never round.
+LINK_UNITS = 48000
+BYTE_UNITS = round(LINK_UNITS / BYTES_PER_SECOND)
+UNITS_PER_MS = LINK_UNITS // 1000
+
+STEP_DEGREES = 10
+STEP_SIZE = 2
+UPDATE_DELAY_MS = 15
+# loop() steps once more than updateDelay ms have passed, i.e. every 16 ms.
+UPDATE_PERIOD_MS = UPDATE_DELAY_MS + 1
+UPDATE_INTERVAL = UPDATE_PERIOD_MS / 1000
+MOVE_INTERVAL = STEP_DEGREES / STEP_SIZE * UPDATE_INTERVAL
+# Framed mode sends at most one position frame per FRAME_INTERVAL and folds every
+# move queued meanwhile into it: a frame is 6 bytes, so it should carry more than
+# one 10 degree step. Two steps' worth keeps a held joystick moving without pauses.
+FRAME_INTERVAL = 2 * MOVE_INTERVAL
+
+CENTER = 90
+TARGET_MIN, TARGET_MAX = 0, 180
+UD_MIN, UD_MAX = 80, 100
+LR_MIN, LR_MAX = 0, 180
+
+DIRECTION_CHARS = frozenset('udlr')
+COMMAND_CHARS = frozenset('udlrcxs')
+
+
+def is_direction(cmd):
+    return bool(cmd) and set(cmd) <= DIRECTION_CHARS
+
+
+def constrain(value, low, high):
+    return max(low, min(high, value))
+
+
+def effective_state(model):
+    # udPos is clamped to 80-100 every step, so any target beyond the clamp moves
+    # the servo exactly like the clamp value itself would.
+    return constrain(model.target_ud, UD_MIN, UD_MAX), model.target_lr, model.spin_on
+
+
+def link_arrivals(recording, speed=1.0, byte_units=BYTE_UNITS):
+    # Yields (arrival, char) for every byte of recording, arrival in link units.
+    # Bytes go out one after another, so a burst queues behind itself; with
+    # byte_units=0 every byte arrives the moment it is sent.
+    line_free = 0
+    for cmd_data in recording:
+        sent = round(cmd_data['time'] / speed * LINK_UNITS)
+        for char in cmd_data['command']:
+            line_free = max(sent, line_free) + byte_units
+            yield line_free, char
+
+
+class TurretModel:
+    def __init__(self, listener=None):
+        self.listener = listener
+        self.reset()
+
+    def reset(self):
+        self.ud_pos = CENTER
+        self.lr_pos = CENTER
+        self.target_ud = CENTER
+        self.target_lr = CENTER
+        self.spin_on = 0
+        self.last_update = 0
+        self.now = 0
+        self.frame = []
+        self.last_seq = None
+        self.lost_frames = 0
+        self.bad_frames = 0
+        self.telemetry_interval = 0
+        self.last_status = 0
+        self.arrived = False
+        # Inputs the sketch measures and the model cannot: pot position and loop() time.
+        self.pot = 512
+        self.loop_ms = 0
+
+    def receive(self, byte):
+        # Mirrors handleByte() in motorcontroller.ino. Returns (changed, reply bytes).
+        if byte & 0x80:
+            self.frame = [byte]
+            return False, b''
+        if self.frame:
+            if byte > MAX_DATA or len(self.frame) >= FRAME_LENGTH:
+                self.frame = []
+                return self.feed(chr(byte)), b''
+            self.frame.append(byte)
+            if self.frame[0] == HELLO and len(self.frame) == HELLO_LENGTH:
+                frame, self.frame = self.frame, []
+                return False, self.handle_hello(frame)
+            if self.frame[0] == FRAME_START and len(self.frame) == FRAME_LENGTH:
+                frame, self.frame = self.frame, []
+                return self.handle_frame(frame), b''
+            if self.frame[0] == TELEMETRY and len(self.frame) == TELEMETRY_LENGTH:
+                frame, self.frame = self.frame, []
+                self.handle_telemetry(frame)
+            return False, b''
+        return self.feed(chr(byte)), b''
+
+    def handle_hello(self, frame):
+        if frame[2] != checksum(frame[1:2]):
+            self.bad_frames += 1
+            return b''
+        # A new session, whose sequence numbers may start over at 0.
+        self.last_seq = None
+        version = min(frame[1], PROTOCOL_VERSION)
+        return bytes((HELLO, version, checksum((version,))))
+
+    def handle_telemetry(self, frame):
+        if frame[2] != checksum(frame[1:2]):
+            self.bad_frames += 1
+            return
+        self.telemetry_interval = frame[1] * TELEMETRY_UNIT_MS
+
+    def poll_status(self, now_ms):
+        # Mirrors the telemetry check at the end of loop(). Returns a status frame or b''.
+        if not self.telemetry_interval:
+            return b''
+        if not self.arrived and now_ms - self.last_status < self.telemetry_interval:
+            return b''
+        self.arrived = False
+        self.last_status = now_ms
+        at_target = (self.ud_pos, self.lr_pos) == effective_state(self)[:2]
+        return status(self.ud_pos, self.lr_pos, self.spin_on, at_target, self.pot, self.loop_ms, self.last_seq)
+
+    def handle_frame(self, frame):
+        seq, pan, tilt, flags, check = frame[1:]
+        if check != checksum(frame[1:5]):
+            self.bad_frames += 1
+            return False
+        if seq == self.last_seq:
+            return False
+        if self.last_seq is not None:
+            self.lost_frames += (seq - self.last_seq - 1) % SEQ_MODULO
+        self.last_seq = seq
+        target = (self.target_ud, self.target_lr, self.spin_on)
+        self.target_lr = constrain(pan * 2, TARGET_MIN, TARGET_MAX)
+        self.target_ud = constrain(tilt * 2, TARGET_MIN, TARGET_MAX)
+        self.spin_on = 1 if flags & FLAG_SPIN else 0
+        return target != (self.target_ud, self.target_lr, self.spin_on)
+
+    def feed(self, char):
+        target = (self.target_ud, self.target_lr, self.spin_on)
+        if char == 'r':
+            self.target_lr = constrain(self.target_lr - STEP_DEGREES, TARGET_MIN, TARGET_MAX)
+        elif char == 'l':
+            self.target_lr = constrain(self.target_lr + STEP_DEGREES, TARGET_MIN, TARGET_MAX)
+        elif char == 'u':
+            self.target_ud = constrain(self.target_ud - STEP_DEGREES, TARGET_MIN, TARGET_MAX)
+        elif char == 'd':
+            self.target_ud = constrain(self.target_ud + STEP_DEGREES, TARGET_MIN, TARGET_MAX)
+        elif char == 'c':
+            self.target_ud = CENTER
+            self.target_lr = CENTER
+        elif char == 'x':
+            self.spin_on = 0
+        elif char == 's':
+            self.spin_on = 1
+        return target != (self.target_ud, self.target_lr, self.spin_on)
+
+    def advance(self, now_ms):
+        while now_ms - self.last_update > UPDATE_DELAY_MS:
+            self.last_update += UPDATE_PERIOD_MS
+            self.now = self.last_update
+            if self.step() and self.listener:
+                self.listener(self.now, self.ud_pos, self.lr_pos)
+        self.now = max(self.now, now_ms)
+
+    def step(self):
+        position = (self.ud_pos, self.lr_pos)
+        if self.ud_pos != self.target_ud:
+            self.ud_pos += STEP_SIZE if self.target_ud > self.ud_pos else -STEP_SIZE
+            self.ud_pos = constrain(self.ud_pos, UD_MIN, UD_MAX)
+        if self.lr_pos != self.target_lr:
+            self.lr_pos += STEP_SIZE if self.target_lr > self.lr_pos else -STEP_SIZE
+            self.lr_pos = constrain(self.lr_pos, LR_MIN, LR_MAX)
+        moved = position != (self.ud_pos, self.lr_pos)
+        if moved and (self.ud_pos, self.lr_pos) == effective_state(self)[:2]:
+            self.arrived = True
+        return moved
+
@@ -0,0 +1,186 @@
+import csv
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from firmware import BYTES_PER_SECOND
+
+# Upper bounds in seconds, Prometheus style (cumulative, with an implicit +Inf).
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+# Finer bounds for the live percentiles: each bucket is 10% wider than the one
+# before, from 0.1 ms up to about 20 s, so a percentile is read to within 10%.
+QUANTILE_BUCKETS = tuple(0.0001 * 1.1 ** i for i in range(130))
+CSV_FIELDS = ('timestamp', 'source', 'command', 'latency', 'write_duration', 'queue_depth')
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the value at fraction, like percentile()
+        # but without keeping or sorting the values.
+        if not self.count:
+            return 0.0
+        rank = min(self.count - 1, int(fraction * self.count))
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen > rank:
+                return bound
+        return self.buckets[-1]
+
+    def prometheus(self, name, labels=''):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f'{name}_bucket{{{labels + "," if labels else ""}{le}}} {cumulative}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class CommandMetrics:
+    def __init__(self, window=5.0, max_samples=10000, bytes_per_second=BYTES_PER_SECOND):
+        self.window = window
+        self.bytes_per_second = bytes_per_second
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=max_samples)
+        self.recent = deque()
+        self.latency = {}
+        self.write_duration = {}
+        self.all_latency = Histogram(QUANTILE_BUCKETS)
+        self.write_sum = 0.0
+        self.write_max = 0.0
+        self.lateness = Histogram()
+        self.motion_latency = Histogram()
+        self.loop_time = None
+        self.max_loop_time = 0.0
+        self.commands_total = {}
+        self.bytes_total = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def record_send(self, source, cmd, latency, write_duration, queue_depth=None, size=None):
+        # queue_depth is only given by whoever owns the queue; other sources leave the gauge alone.
+        # size is the number of bytes written, when cmd was encoded into something else.
+        size = len(cmd) if size is None else size
+        now = time.monotonic()
+        with self.lock:
+            self.samples.append((time.time(), source, cmd, latency, write_duration, queue_depth))
+            self.recent.append((now, size))
+            self.latency.setdefault(source, Histogram()).observe(latency)
+            self.write_duration.setdefault(source, Histogram()).observe(write_duration)
+            self.all_latency.observe(latency)
+            self.write_sum += write_duration
+            self.write_max = max(self.write_max, write_duration)
+            self.commands_total[source] = self.commands_total.get(source, 0) + 1
+            self.bytes_total[source] = self.bytes_total.get(source, 0) + size
+            if queue_depth is not None:
+                self.queue_depth = queue_depth
+                self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def record_lateness(self, lateness):
+        with self.lock:
+            self.lateness.observe(lateness)
+
+    def record_motion(self, latency):
+        # From sending a position to the turret reporting it has arrived there.
+        with self.lock:
+            self.motion_latency.observe(latency)
+
+    def record_loop(self, loop_time):
+        with self.lock:
+            self.loop_time = loop_time
+            self.max_loop_time = max(self.max_loop_time, loop_time)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and self.recent[0][0] < now - self.window:
+                self.recent.popleft()
+            commands = len(self.recent)
+            sent_bytes = sum(size for _, size in self.recent)
+            sends = self.all_latency.count
+            return {
+                'commands_per_second': commands / self.window,
+                'bytes_per_second': sent_bytes / self.window,
+                'link_utilization': sent_bytes / self.window / self.bytes_per_second,
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'latency_p50': self.all_latency.quantile(0.5),
+                'latency_p95': self.all_latency.quantile(0.95),
+                'write_mean': self.write_sum / sends if sends else 0.0,
+                'write_max': self.write_max,
+                'lateness_mean': self.lateness.sum / self.lateness.count if self.lateness.count else 0.0,
+                'lateness_count': self.lateness.count,
+                'motion_latency_mean': (self.motion_latency.sum / self.motion_latency.count
+                                        if self.motion_latency.count else 0.0),
+                'loop_time': self.loop_time,
+                'max_loop_time': self.max_loop_time,
+            }
+
+    def export_csv(self, path):
+        with self.lock:
+            samples = list(self.samples)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            writer.writerows(samples)
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        with self.lock:
+            lines = [
+                '# TYPE turret_commands_total counter',
+                *(f'turret_commands_total{{source="{s}"}} {n}' for s, n in self.commands_total.items()),
+                '# TYPE turret_bytes_total counter',
+                *(f'turret_bytes_total{{source="{s}"}} {n}' for s, n in self.bytes_total.items()),
+                '# TYPE turret_command_latency_seconds histogram',
+            ]
+            for source, histogram in self.latency.items():
+                lines += histogram.prometheus('turret_command_latency_seconds', f'source="{source}"')
+            lines.append('# TYPE turret_write_duration_seconds histogram')
+            for source, histogram in self.write_duration.items():
+                lines += histogram.prometheus('turret_write_duration_seconds', f'source="{source}"')
+            lines.append('# TYPE turret_playback_lateness_seconds histogram')
+            lines += self.lateness.prometheus('turret_playback_lateness_seconds')
+            lines.append('# TYPE turret_motion_latency_seconds histogram')
+            lines += self.motion_latency.prometheus('turret_motion_latency_seconds')
+        lines += [
+            '# TYPE turret_queue_depth gauge',
+            f'turret_queue_depth {snapshot["queue_depth"]}',
+            '# TYPE turret_bytes_per_second gauge',
+            f'turret_bytes_per_second {snapshot["bytes_per_second"]}',
+            '# TYPE turret_link_utilization gauge',
+            f'turret_link_utilization {snapshot["link_utilization"]}',
+        ]
+        if snapshot['loop_time'] is not None:
+            lines += [
+                '# TYPE turret_loop_seconds gauge',
+                f'turret_loop_seconds {snapshot["loop_time"]}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path):
+        with open(path, 'w') as f:
+            f.write(self.prometheus())
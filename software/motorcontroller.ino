@@ -19,6 +19,33 @@ const int updateDelay = 15;    // ms between servo updates
 
 unsigned long lastUpdate = 0;
 
+// Framed protocol, see protocol.py. Legacy single-character commands still work.
+const byte frameStart = 0xA5;
+const byte helloStart = 0xA6;
+const byte statusStart = 0xA7;
+const byte telemetryStart = 0xA8;
+const byte protocolVersion = 1;
+const int frameLength = 6;
+const int helloLength = 3;
+const int statusLength = 8;
+const int telemetryLength = 3;
+const byte maxData = 90;
+const byte flagSpin = 0x01;
+const byte flagAtTarget = 0x02;
+const byte flagSeqValid = 0x04;
+
+byte frame[frameLength];
+int frameSize = 0;
+int lastSeq = -1;
+unsigned long lostFrames = 0;
+unsigned long badFrames = 0;
+
+// Telemetry: status frames every telemetryInterval ms (0 = off) and on arrival.
+unsigned long telemetryInterval = 0;
+unsigned long lastStatus = 0;
+unsigned long loopMaxUs = 0;
+bool arrived = false;
+
 int bubbleSpinOn;
 int bubbleSpinSpeed;
 int change = 0;
@@ -43,20 +70,10 @@ void setup() {
 }
 
 void loop() {
+  unsigned long loopStart = micros();
+
   if (Serial1.available()) {
-    char command = Serial1.read();
-    switch (command) {
-      case 'r': targetLr = constrain(targetLr - 10, 0, 180); break;
-      case 'l': targetLr = constrain(targetLr + 10, 0, 180); break;
-      case 'u': targetUd = constrain(targetUd - 10, 0, 180); break;
-      case 'd': targetUd = constrain(targetUd + 10, 0, 180); break;
-      case 'c': 
-        targetUd = 90; 
-        targetLr = 90; 
-        break;
-      case 'x': bubbleSpinOn = 0; break; 
-      case 's': bubbleSpinOn = 1; break; 
-    }
+    handleByte(Serial1.read());
   }
 
   long temp = millis();
@@ -68,6 +85,8 @@ void loop() {
   unsigned long now = millis();
   if (now - lastUpdate > updateDelay) {
     lastUpdate = now;
+    int prevUd = udPos;
+    int prevLr = lrPos;
 
     if (udPos != targetUd) {
       udPos += (targetUd > udPos) ? stepSize : -stepSize;
@@ -80,6 +99,133 @@ void loop() {
       lrPos = constrain(lrPos, 0, 180);
       leftRight.write(lrPos);
     }
+
+    if ((udPos != prevUd || lrPos != prevLr) && atTarget()) {
+      arrived = true;
+    }
+  }
+
+  if (telemetryInterval > 0 && (arrived || now - lastStatus >= telemetryInterval)) {
+    sendStatus(now);
+  }
+
+  loopMaxUs = max(loopMaxUs, micros() - loopStart);
+}
+
+bool atTarget() {
+  return udPos == constrain(targetUd, 80, 100) && lrPos == targetLr;
+}
+
+void sendStatus(unsigned long now) {
+  byte flags = 0;
+  if (bubbleSpinOn == 1) flags |= flagSpin;
+  if (atTarget()) flags |= flagAtTarget;
+  if (lastSeq >= 0) flags |= flagSeqValid;
+
+  byte status[statusLength];
+  status[0] = statusStart;
+  status[1] = udPos / 2;
+  status[2] = lrPos / 2;
+  status[3] = flags;
+  status[4] = prevPot / 16;
+  status[5] = min((loopMaxUs + 999) / 1000, (unsigned long) maxData);
+  status[6] = lastSeq >= 0 ? lastSeq : 0;
+  status[7] = checksum(status + 1, statusLength - 2);
+  Serial1.write(status, statusLength);
+
+  arrived = false;
+  lastStatus = now;
+  loopMaxUs = 0;
+}
+
+void handleByte(byte b) {
+  if (b & 0x80) {
+    frame[0] = b;
+    frameSize = 1;
+    return;
+  }
+  if (frameSize > 0) {
+    if (b > maxData || frameSize >= frameLength) {
+      // Not frame data, so the frame was cut short; treat it as a legacy command.
+      frameSize = 0;
+      handleCommand(b);
+      return;
+    }
+    frame[frameSize++] = b;
+    if (frame[0] == helloStart && frameSize == helloLength) {
+      frameSize = 0;
+      handleHello();
+    } else if (frame[0] == frameStart && frameSize == frameLength) {
+      frameSize = 0;
+      handleFrame();
+    } else if (frame[0] == telemetryStart && frameSize == telemetryLength) {
+      frameSize = 0;
+      handleTelemetry();
+    }
+    return;
+  }
+  handleCommand(b);
+}
+
+byte checksum(byte *data, int length) {
+  byte sum = 0;
+  for (int i = 0; i < length; i++) {
+    sum += data[i];
+  }
+  return sum & 0x3F;
+}
+
+void handleHello() {
+  if (frame[2] != checksum(frame + 1, 1)) {
+    badFrames++;
+    return;
+  }
+  // A hello starts a new session whose sequence numbers may start over at 0,
+  // and a stale lastSeq would drop its first frame as a duplicate.
+  lastSeq = -1;
+  byte version = min(frame[1], protocolVersion);
+  byte reply[helloLength] = {helloStart, version, checksum(&version, 1)};
+  Serial1.write(reply, helloLength);
+}
+
+void handleTelemetry() {
+  if (frame[2] != checksum(frame + 1, 1)) {
+    badFrames++;
+    return;
+  }
+  telemetryInterval = (unsigned long) frame[1] * 10;
+}
+
+void handleFrame() {
+  if (frame[5] != checksum(frame + 1, 4)) {
+    badFrames++;
+    return;
+  }
+  int seq = frame[1];
+  if (seq == lastSeq) {
+    return;
+  }
+  if (lastSeq >= 0) {
+    lostFrames += (seq - lastSeq - 1 + 64) % 64;
+  }
+  lastSeq = seq;
+  targetLr = constrain(frame[2] * 2, 0, 180);
+  targetUd = constrain(frame[3] * 2, 0, 180);
+  bubbleSpinOn = (frame[4] & flagSpin) ? 1 : 0;
+}
+
+void handleCommand(char command) {
+  switch (command) {
+    case 'r': targetLr = constrain(targetLr - 10, 0, 180); break;
+    case 'l': targetLr = constrain(targetLr + 10, 0, 180); break;
+    case 'u': targetUd = constrain(targetUd - 10, 0, 180); break;
+    case 'd': targetUd = constrain(targetUd + 10, 0, 180); break;
+    case 'c': 
+      targetUd = 90; 
+      targetLr = 90; 
+      break;
+    case 'x': bubbleSpinOn = 0; break; 
+    case 's': bubbleSpinOn = 1; break; 
   }
 }
 
@@ -0,0 +1,129 @@
+import argparse
+import os
+
+from firmware import (BYTE_UNITS, CENTER, LINK_UNITS, STEP_DEGREES, UD_MAX, UD_MIN, UNITS_PER_MS, UPDATE_PERIOD_MS,
+                      TurretModel, link_arrivals)
+from recordingformat import load_recording, save_recording
+
+
+def moves(ud, lr, want_ud, want_lr):
+    ud_steps = (want_ud - ud) // STEP_DEGREES
+    lr_steps = (want_lr - lr) // STEP_DEGREES
+    ud_chars = ('d' if ud_steps > 0 else 'u') * abs(ud_steps)
+    lr_chars = ('l' if lr_steps > 0 else 'r') * abs(lr_steps)
+    # Interleave the axes so both start moving together, as a diagonal would.
+    shared = min(len(ud_chars), len(lr_chars))
+    return ''.join(a + b for a, b in zip(ud_chars, lr_chars)) + ud_chars[shared:] + lr_chars[shared:]
+
+
+def plan(current, desired):
+    ud, lr, spin = current
+    want_ud, want_lr, want_spin = desired
+    cmd = ''
+    if (ud, lr) != (want_ud, want_lr):
+        direct = moves(ud, lr, want_ud, want_lr)
+        via_center = 'c' + moves(CENTER, CENTER, want_ud, want_lr)
+        cmd = min(direct, via_center, key=len)
+    if spin != want_spin:
+        cmd += 's' if want_spin else 'x'
+    return cmd
+
+
+def tilt_target(target_ud, want_ud):
+    # Where to leave the tilt target so it holds udPos where want_ud does. Past
+    # the clamp any value will do, so the one needing fewest steps from target_ud;
+    # it never needs more than the original took to get to want_ud.
+    if want_ud > UD_MAX:
+        return max(UD_MAX, min(target_ud, want_ud))
+    if want_ud < UD_MIN:
+        return min(UD_MIN, max(target_ud, want_ud))
+    return want_ud
+
+
+def optimize(recording, merge_window=0.0, link=True):
+    # Works on what the sketch sees: bytes arrive over the link one after another
+    # and the servos only read their targets at each update, every 16 ms. All the
+    # bytes arriving between two updates are replaced by the fewest bytes that
+    # reach the same state, timed to arrive in that same gap. There are never more
+    # of them than the bytes they replace, so they never arrive later, and the
+    # servos take the same path update for update. Spin changes are all kept, in
+    # order: the sketch reads the spin flag on its own 100 ms timer, not at updates.
+    #
+    # A recording can start wherever the turret was left, so nothing is known
+    # about its position until the first 'c': every command up to and including
+    # that one is kept as it is. Likewise the first 's' or 'x' is always kept.
+    byte_units = BYTE_UNITS if link else 0
+    update_units = UPDATE_PERIOD_MS * UNITS_PER_MS
+    merge_units = merge_window * LINK_UNITS
+    model = TurretModel()
+    optimized = []
+    group_start = None
+    spin_changes = ''
+
+    arrivals = list(link_arrivals(recording, byte_units=byte_units))
+    prefix = next((i + 1 for i, cmd_data in enumerate(recording) if 'c' in cmd_data['command']), len(recording))
+    optimized.extend(dict(cmd_data) for cmd_data in recording[:prefix])
+    prefix_bytes = wire_bytes(optimized)
+    for _, char in arrivals[:prefix_bytes]:
+        model.feed(char)
+    spin_known = any(char in 'sx' for _, char in arrivals[:prefix_bytes])
+    # The kept commands can leave the tilt target past the clamp, so the state
+    # tracked is the targets the sketch holds, not where udPos settles.
+    current = (model.target_ud, model.target_lr, model.spin_on)
+
+    for i in range(prefix_bytes, len(arrivals)):
+        arrival, char = arrivals[i]
+        if group_start is None:
+            group_start = arrival
+        spin = model.spin_on
+        model.feed(char)
+        if model.spin_on != spin or (char in 'sx' and not spin_known):
+            spin_changes += char
+            spin_known = True
+
+        if i + 1 < len(arrivals):
+            next_arrival = arrivals[i + 1][0]
+            if next_arrival // update_units == arrival // update_units:
+                continue
+            # Bytes closer together than merge_window are folded into one change.
+            if next_arrival - group_start < merge_units:
+                continue
+
+        desired = (tilt_target(current[0], model.target_ud), model.target_lr, model.spin_on)
+        if desired != current or spin_changes:
+            cmd = plan(current, desired[:2] + current[2:]) + spin_changes
+            # Sent one byte time early, the first byte lands when the original one did.
+            # Microseconds are finer than a link unit, so rounding keeps it exact.
+            optimized.append({'command': cmd, 'time': round((group_start - byte_units) / LINK_UNITS, 6)})
+            current = desired
+        group_start = None
+        spin_changes = ''
+    return optimized
+
+
+def wire_bytes(recording):
+    return sum(len(cmd_data['command']) for cmd_data in recording)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rewrite a recording as the smallest command stream that moves the turret the same way.")
+    parser.add_argument('src')
+    parser.add_argument('dst')
+    parser.add_argument('--merge-window', type=float, default=0.0, metavar='SECONDS',
+                        help="also merge commands closer together than this; the turret then moves ahead of "
+                             "the original by a few degrees while a merged burst is in flight")
+    args = parser.parse_args()
+
+    recording = list(load_recording(args.src))
+    optimized = optimize(recording, args.merge_window)
+    save_recording(args.dst, optimized)
+
+    before, after = wire_bytes(recording), wire_bytes(optimized)
+    print(f"Commands: {len(recording)} -> {len(optimized)}")
+    print(f"Link bytes: {before} -> {after} ({before - after} saved)")
+    print(f"File size: {os.path.getsize(args.src)} -> {os.path.getsize(args.dst)} bytes")
+
+
+if __name__ == "__main__":
+    main()
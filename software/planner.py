@@ -0,0 +1,136 @@
+import argparse
+import json
+import time
+
+try:
+    import numpy as np
+except ImportError as e:
+    # Only this tool needs NumPy, so the controller does not list it as a dependency.
+    raise ImportError(f"planner.py needs NumPy (pip install numpy): {e}") from e
+
+from firmware import BYTES_PER_SECOND, CENTER, LR_MAX, LR_MIN, MOVE_INTERVAL, STEP_DEGREES, UD_MAX, UD_MIN
+from recordingformat import save_recording
+
+# A tick moves each axis by at most one STEP_DEGREES command. The firmware needs
+# MOVE_INTERVAL to slew that far, and a diagonal tick is two bytes on the wire.
+TICK_BYTES = 2
+TICK_INTERVAL = max(MOVE_INTERVAL, TICK_BYTES / BYTES_PER_SECOND)
+
+
+def quantize(points):
+    # Commands move targets in STEP_DEGREES from center, so only grid points are reachable.
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    grid = np.rint((points - CENTER) / STEP_DEGREES).astype(int)
+    low = -((CENTER - np.array([LR_MIN, UD_MIN])) // STEP_DEGREES)
+    high = (np.array([LR_MAX, UD_MAX]) - CENTER) // STEP_DEGREES
+    return np.clip(grid, low, high)
+
+
+def plan_path(points, times=None, start=(CENTER, CENTER), interval=TICK_INTERVAL):
+    # points are (pan, tilt) targets in degrees. Each target is reached as fast as
+    # the firmware can slew, moving both axes together; times, if given, are the
+    # earliest moment each target may start being approached.
+    # Returns (commands, times) as NumPy arrays.
+    grid = quantize(np.vstack([np.asarray(start, dtype=float).reshape(1, 2), np.asarray(points, dtype=float)]))
+    delta = np.diff(grid, axis=0)
+    keep = np.any(delta != 0, axis=1)
+    delta = delta[keep]
+    if not len(delta):
+        return np.array([], dtype=str), np.array([], dtype=float)
+
+    ticks = np.abs(delta).max(axis=1)
+    first_tick = np.concatenate(([0], np.cumsum(ticks)[:-1]))
+    segment = np.repeat(np.arange(len(delta)), ticks)
+    offset = np.arange(ticks.sum()) - first_tick[segment]
+
+    steps = np.abs(delta)[segment]
+    signs = np.sign(delta)[segment]
+    moving = offset[:, None] < steps
+    # Screen left is 'l', which raises lrPos; 'u' lowers udPos.
+    pan = np.where(moving[:, 0], np.where(signs[:, 0] > 0, 'l', 'r'), '')
+    tilt = np.where(moving[:, 1], np.where(signs[:, 1] > 0, 'd', 'u'), '')
+    commands = np.char.add(tilt, pan)
+
+    # Segment i starts once segment i-1 is done and not before its requested time.
+    earliest = first_tick * interval
+    if times is None:
+        starts = earliest
+    else:
+        requested = np.asarray(times, dtype=float)[keep]
+        starts = earliest + np.maximum.accumulate(np.maximum(requested - earliest, 0.0))
+    return commands, starts[segment] + offset * interval
+
+
+def to_recording(commands, times):
+    return [{'command': cmd, 'time': t} for cmd, t in zip(commands.tolist(), np.round(times, 6).tolist())]
+
+
+def compile_path(points, times=None, center_first=True):
+    commands, times = plan_path(points, times)
+    recording = to_recording(commands, times)
+    if center_first:
+        # Recordings may start from anywhere; the plan assumes the turret is centered.
+        recording.insert(0, {'command': 'c', 'time': 0.0})
+    return recording
+
+
+def sweep(pan_low=LR_MIN, pan_high=LR_MAX, tilt=CENTER, cycles=1):
+    pan = np.tile([pan_high, pan_low], cycles)
+    return np.column_stack([pan, np.full(len(pan), tilt)])
+
+
+def figure_eight(width=60, height=10, cycles=1, samples=64):
+    t = np.linspace(0, 2 * np.pi * cycles, samples * cycles, endpoint=False)
+    return np.column_stack([CENTER + width * np.sin(t), CENTER + height * np.sin(2 * t)])
+
+
+def load_points(value):
+    if value.lstrip().startswith('['):
+        return json.loads(value)
+    with open(value, 'r') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a target path into a recording the turret can follow.")
+    parser.add_argument('shape', choices=('sweep', 'figure8', 'waypoints'))
+    parser.add_argument('dst', help="recording to write, .btr or .json")
+    parser.add_argument('--points', help="waypoints as a JSON list of [pan, tilt] or [pan, tilt, time], "
+                                         "given inline or as the path of a JSON file")
+    parser.add_argument('--pan', type=float, nargs=2, default=(LR_MIN, LR_MAX), metavar=('LOW', 'HIGH'))
+    parser.add_argument('--tilt', type=float, default=CENTER)
+    parser.add_argument('--width', type=float, default=60)
+    parser.add_argument('--height', type=float, default=10)
+    parser.add_argument('--samples', type=int, default=64, help="points per figure-eight cycle")
+    parser.add_argument('--cycles', type=int, default=1)
+    args = parser.parse_args()
+
+    times = None
+    if args.shape == 'sweep':
+        points = sweep(args.pan[0], args.pan[1], args.tilt, args.cycles)
+    elif args.shape == 'figure8':
+        points = figure_eight(args.width, args.height, args.cycles, args.samples)
+    else:
+        if not args.points:
+            parser.error("waypoints needs --points")
+        try:
+            waypoints = np.asarray(load_points(args.points), dtype=float)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read --points: {e}")
+        if waypoints.ndim != 2 or waypoints.shape[1] not in (2, 3):
+            parser.error("--points must be a list of [pan, tilt] or [pan, tilt, time]")
+        points = waypoints[:, :2]
+        if waypoints.shape[1] > 2:
+            times = waypoints[:, 2]
+
+    started = time.perf_counter()
+    recording = compile_path(points, times)
+    elapsed = time.perf_counter() - started
+    save_recording(args.dst, recording)
+    duration = recording[-1]['time'] if recording else 0.0
+    print(f"{len(points)} points -> {len(recording)} commands over {duration:.2f} s, "
+          f"planned in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
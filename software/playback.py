@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+MIN_SPEED = 0.5
+MAX_SPEED = 4.0
+
+
+class PlaybackEngine:
+    def __init__(self, recording, send, speed=1.0, loop=False, on_command=None, on_error=None,
+                 clock=time.monotonic, metrics=None, start_time=None):
+        if not MIN_SPEED <= speed <= MAX_SPEED:
+            raise ValueError(f"Playback speed must be between {MIN_SPEED}x and {MAX_SPEED}x, got {speed}x")
+        # send is a coroutine function taking a command string, e.g. TurretLink.send,
+        # which queues it with live input so both share the transmitter's pacing.
+        self.recording = recording
+        self.send = send
+        self.speed = speed
+        self.loop = loop
+        self.on_command = on_command
+        self.on_error = on_error
+        self.clock = clock
+        self.metrics = metrics
+        # A shared start_time lets several engines play in lockstep.
+        self.start_time = start_time
+
+        self.stop_event = asyncio.Event()
+        self.count = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def stop(self):
+        self.stop_event.set()
+
+    async def wait_until(self, deadline):
+        # Sleeps rather than spins: the timer may overshoot by a millisecond, but the
+        # loop stays free for telemetry, reconnects and the GUI in the meantime.
+        remaining = deadline - self.clock()
+        if remaining > 0:
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return not self.stop_event.is_set()
+
+    async def run(self):
+        try:
+            start = self.clock() if self.start_time is None else self.start_time
+            offset = 0.0
+            while not self.stop_event.is_set():
+                last_time = 0.0
+                count = 0
+                commands = iter(self.recording)
+                cmd_data = next(commands, None)
+                while cmd_data is not None:
+                    # Every deadline is absolute, so time spent sending never accumulates.
+                    deadline = start + (offset + cmd_data['time']) / self.speed
+                    if not await self.wait_until(deadline):
+                        break
+                    # Whatever else is already due goes out in the same write; in framed
+                    # mode that makes one frame of a burst rather than a queue of them.
+                    now = self.clock()
+                    batch = [(cmd_data, deadline)]
+                    cmd_data = next(commands, None)
+                    while cmd_data is not None:
+                        due = start + (offset + cmd_data['time']) / self.speed
+                        if due > now:
+                            break
+                        batch.append((cmd_data, due))
+                        cmd_data = next(commands, None)
+                    await self.send(''.join(data['command'] for data, _ in batch))
+                    for data, due in batch:
+                        lateness = now - due
+                        self.count += 1
+                        self.total_lateness += lateness
+                        self.max_lateness = max(self.max_lateness, lateness)
+                        # The send itself is counted by the transmitter, with its queue depth.
+                        if self.metrics:
+                            self.metrics.record_lateness(lateness)
+                        if self.on_command:
+                            self.on_command(data['command'], lateness)
+                        last_time = data['time']
+                        count += 1
+
+                if not self.loop or count == 0:
+                    break
+                offset += last_time
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+        return self.stats()
+
+    def stats(self):
+        return {
+            'commands': self.count,
+            'mean_lateness': self.total_lateness / self.count if self.count else 0.0,
+            'max_lateness': self.max_lateness,
+        }
@@ -0,0 +1,101 @@
+# Framed protocol shared by the controller and motorcontroller.ino.
+#
+#   position frame   0xA5, seq, pan / 2, tilt / 2, flags, checksum
+#   hello frame      0xA6, version, checksum
+#   telemetry frame  0xA8, interval / 10 ms (0 = off), checksum
+#   status frame     0xA7, udPos / 2, lrPos / 2, flags, pot / 16, loop ms, seq, checksum
+#
+# Status frames go from the turret to the controller, every telemetry interval
+# and whenever the servos reach their targets. seq is the last position frame
+# the turret accepted; loop ms is the longest loop() pass since the last status.
+#
+# Only start bytes have the high bit set and every other byte is at most 90,
+# below the lowest legacy command ('c' = 99). A lost byte therefore never turns
+# frame data into a legacy command, and the next start byte resynchronizes.
+# Targets are absolute, so one dropped frame costs only that update.
+
+FRAME_START = 0xA5
+HELLO = 0xA6
+STATUS = 0xA7
+TELEMETRY = 0xA8
+PROTOCOL_VERSION = 1
+FRAME_LENGTH = 6
+HELLO_LENGTH = 3
+STATUS_LENGTH = 8
+TELEMETRY_LENGTH = 3
+TELEMETRY_UNIT_MS = 10
+MAX_DATA = 90
+SEQ_MODULO = 64
+FLAG_SPIN = 0x01
+FLAG_AT_TARGET = 0x02
+FLAG_SEQ_VALID = 0x04
+
+
+def checksum(data):
+    return sum(data) & 0x3F
+
+
+def hello(version=PROTOCOL_VERSION):
+    return bytes((HELLO, version, checksum((version,))))
+
+
+def parse_hello(data):
+    for i in range(len(data) - HELLO_LENGTH + 1):
+        if data[i] == HELLO and data[i + 2] == checksum((data[i + 1],)):
+            return data[i + 1]
+    return None
+
+
+def telemetry(interval_ms):
+    units = max(0, min(MAX_DATA, round(interval_ms / TELEMETRY_UNIT_MS)))
+    return bytes((TELEMETRY, units, checksum((units,))))
+
+
+def status(ud_pos, lr_pos, spin_on, at_target, pot, loop_ms, seq):
+    flags = (FLAG_SPIN if spin_on else 0) | (FLAG_AT_TARGET if at_target else 0)
+    if seq is not None:
+        flags |= FLAG_SEQ_VALID
+    data = (ud_pos // 2, lr_pos // 2, flags, pot // 16, min(loop_ms, MAX_DATA), seq or 0)
+    return bytes((STATUS,) + data + (checksum(data),))
+
+
+class StatusParser:
+    def __init__(self):
+        self.frame = []
+        self.bad_frames = 0
+
+    def feed(self, data):
+        statuses = []
+        for byte in data:
+            if byte & 0x80:
+                self.frame = [byte] if byte == STATUS else []
+                continue
+            if not self.frame:
+                continue
+            self.frame.append(byte)
+            if len(self.frame) == STATUS_LENGTH:
+                frame, self.frame = self.frame, []
+                if frame[7] != checksum(frame[1:7]):
+                    self.bad_frames += 1
+                    continue
+                ud, lr, flags, pot, loop_ms, seq = frame[1:7]
+                statuses.append({
+                    'ud_pos': ud * 2,
+                    'lr_pos': lr * 2,
+                    'spin_on': 1 if flags & FLAG_SPIN else 0,
+                    'at_target': bool(flags & FLAG_AT_TARGET),
+                    'pot': pot * 16,
+                    'loop_ms': loop_ms,
+                    'seq': seq if flags & FLAG_SEQ_VALID else None,
+                })
+        return statuses
+
+
+class FrameEncoder:
+    def __init__(self):
+        self.seq = 0
+
+    def encode(self, pan, tilt, spin):
+        data = (self.seq, pan // 2, tilt // 2, FLAG_SPIN if spin else 0)
+        self.seq = (self.seq + 1) % SEQ_MODULO
+        return bytes((FRAME_START,) + data + (checksum(data),))
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from firmware import BYTES_PER_SECOND, COMMAND_CHARS, TurretModel, effective_state
+from optimizer import optimize, wire_bytes
+from recordingformat import load_recording
+from recordingstore import scan_directory
+
+# A recording is flagged when more than this share of its moves do nothing.
+WASTE_THRESHOLD = 0.2
+# Share of the link a recording may use in its busiest second.
+BUDGET_THRESHOLD = 0.5
+
+
+def recording_files(directory):
+    return sorted(entry.path for _, entry in scan_directory(directory).values())
+
+
+def peak_bytes_per_second(events):
+    # Largest number of bytes sent in any one-second window.
+    peak = 0
+    window = 0
+    start = 0
+    for t, size in events:
+        window += size
+        while events[start][0] <= t - 1.0:
+            window -= events[start][1]
+            start += 1
+        peak = max(peak, window)
+    return peak
+
+
+def analyze(path, optimized_size=False):
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        recording = list(load_recording(path))
+        commands = [str(cmd_data['command']) for cmd_data in recording]
+        times = [float(cmd_data['time']) for cmd_data in recording]
+    except Exception as e:
+        return {'name': name, 'path': path, 'error': f"{type(e).__name__}: {e}"}
+
+    histogram = Counter()
+    unknown = 0
+    ud_clamp_hits = 0
+    lr_clamp_hits = 0
+    no_ops = 0
+    model = TurretModel()
+    for cmd in commands:
+        for char in cmd:
+            histogram[char] += 1
+            if char not in COMMAND_CHARS:
+                unknown += 1
+                continue
+            before = effective_state(model)
+            model.feed(char)
+            if effective_state(model) == before:
+                no_ops += 1
+                if char in 'ud':
+                    ud_clamp_hits += 1
+                elif char in 'lr':
+                    lr_clamp_hits += 1
+
+    backwards = sum(1 for previous, t in zip(times, times[1:]) if t < previous)
+    duration = max(times, default=0.0)
+    total_bytes = sum(len(cmd) for cmd in commands)
+    peak = peak_bytes_per_second(sorted(zip(times, map(len, commands))))
+    moves = sum(histogram[char] for char in 'udlr')
+    optimized_bytes = None
+    if optimized_size and not unknown and not backwards:
+        # Costs about as much as the rest of the analysis, hence opt-in.
+        optimized_bytes = wire_bytes(optimize(recording))
+
+    issues = []
+    if not commands:
+        issues.append('empty')
+    if unknown:
+        issues.append('unknown commands')
+    if backwards or (times and times[0] < 0):
+        issues.append('non-monotonic time')
+    if moves and (ud_clamp_hits + lr_clamp_hits) / moves > WASTE_THRESHOLD:
+        issues.append('clamp hits')
+    if peak / BYTES_PER_SECOND > BUDGET_THRESHOLD:
+        issues.append('over link budget')
+
+    return {
+        'name': name,
+        'path': path,
+        'commands': len(commands),
+        'duration': duration,
+        'bytes': total_bytes,
+        'bytes_per_second': total_bytes / duration if duration > 0 else 0.0,
+        'peak_bytes_per_second': peak,
+        'peak_link_utilization': peak / BYTES_PER_SECOND,
+        'histogram': dict(sorted(histogram.items())),
+        'unknown_chars': unknown,
+        'backwards_times': backwards,
+        'ud_clamp_hits': ud_clamp_hits,
+        'lr_clamp_hits': lr_clamp_hits,
+        'no_ops': no_ops,
+        'optimized_bytes': optimized_bytes,
+        'issues': issues,
+    }
+
+
+def analyze_library(directory, workers=None, optimized_size=False):
+    paths = recording_files(directory)
+    if not paths:
+        return []
+    # Per-file work is small, so hand it out in chunks to keep pool overhead down.
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * 8))
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(partial(analyze, optimized_size=optimized_size), paths, chunksize=chunksize))
+
+
+def summarize(reports):
+    good = [report for report in reports if 'error' not in report]
+    histogram = Counter()
+    issues = Counter()
+    for report in good:
+        histogram.update(report['histogram'])
+        issues.update(report['issues'])
+    optimizable = [report for report in good if report['optimized_bytes'] is not None]
+    return {
+        'files': len(reports),
+        'broken': len(reports) - len(good),
+        'commands': sum(report['commands'] for report in good),
+        'duration': sum(report['duration'] for report in good),
+        'bytes': sum(report['bytes'] for report in good),
+        'optimized_bytes': sum(report['optimized_bytes'] for report in optimizable) if optimizable else None,
+        'peak_link_utilization': max((report['peak_link_utilization'] for report in good), default=0.0),
+        'histogram': dict(sorted(histogram.items())),
+        'issues': dict(issues.most_common()),
+        'flagged': sum(1 for report in good if report['issues']),
+    }
+
+
+def print_report(reports, summary, verbose=False):
+    for report in reports:
+        if 'error' in report:
+            print(f"{report['name']}: BROKEN ({report['error']})")
+        elif verbose or report['issues']:
+            issues = ', '.join(report['issues']) or 'ok'
+            print(f"{report['name']}: {report['commands']} commands, {report['duration']:.1f} s, "
+                  f"{report['bytes_per_second']:.1f} B/s (peak {report['peak_link_utilization']:.0%} of link), "
+                  f"clamp hits ud {report['ud_clamp_hits']} / lr {report['lr_clamp_hits']} - {issues}")
+
+    print(f"{summary['files']} recordings, {summary['broken']} broken, {summary['flagged']} flagged")
+    line = f"{summary['commands']} commands over {summary['duration'] / 60:.1f} min, {summary['bytes']} bytes"
+    if summary['optimized_bytes'] is not None:
+        line += f" ({summary['optimized_bytes']} after optimizing)"
+    print(line)
+    print("Commands: " + ', '.join(f"{char!r} {count}" for char, count in summary['histogram'].items()))
+    if summary['issues']:
+        print("Issues: " + ', '.join(f"{issue} {count}" for issue, count in summary['issues'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and profile every recording in a directory.")
+    parser.add_argument('directory', nargs='?', default="recordings")
+    parser.add_argument('--workers', type=int, help="processes to use, one per CPU by default")
+    parser.add_argument('--json', metavar='FILE', help="also write every report and the summary as JSON")
+    parser.add_argument('--verbose', action='store_true', help="list every recording, not only flagged ones")
+    parser.add_argument('--optimized-size', action='store_true',
+                        help="also report each recording's size after optimizer.py; roughly doubles the run time")
+    parser.add_argument('--strict', action='store_true', help="exit 1 if any recording is broken or flagged")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    reports = analyze_library(args.directory, args.workers, args.optimized_size)
+    summary = summarize(reports)
+    elapsed = time.perf_counter() - started
+
+    print_report(reports, summary, args.verbose)
+    print(f"Analyzed in {elapsed:.2f} s")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'recordings': reports}, f, indent=2)
+    if args.strict and (summary['broken'] or summary['flagged']):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+
+# Layout (little endian):
+#   header   magic "BTRC", version u8, flags u8, table size u16, command count u32, duration us i64
+#   table    table size x (length u8, command bytes) - the distinct command strings
+#   commands command count x u8 index into the table
+#   times    command count x zigzag varint delta from the previous timestamp, in microseconds
+# Timestamps are stored to the microsecond, so JSON -> binary -> JSON keeps every
+# time value to 1 us; commands are kept exactly.
+MAGIC = b'BTRC'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHIq')
+TIME_UNIT = 1e-6
+EXTENSION = '.btr'
+
+
+class RecordingFormatError(ValueError):
+    pass
+
+
+def encode_varint(value, out):
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode(recording):
+    table = []
+    codes = {}
+    commands = bytearray()
+    times = bytearray()
+    last = 0
+    for cmd_data in recording:
+        cmd = cmd_data['command']
+        if cmd not in codes:
+            if len(table) == 256:
+                raise RecordingFormatError("More than 256 distinct commands in one recording")
+            codes[cmd] = len(table)
+            table.append(cmd.encode())
+        commands.append(codes[cmd])
+        ticks = round(cmd_data['time'] / TIME_UNIT)
+        encode_varint(ticks - last, times)
+        last = ticks
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, 0, len(table), len(commands), last))
+    for entry in table:
+        out.append(len(entry))
+        out += entry
+    out += commands
+    out += times
+    return bytes(out)
+
+
+def write_binary(path, recording):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(encode(recording))
+    os.replace(tmp_path, path)
+
+
+def read_header(data):
+    if len(data) < HEADER.size:
+        raise RecordingFormatError("File too short for a recording header")
+    magic, version, flags, table_size, count, duration = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise RecordingFormatError("Not a binary recording")
+    if version != VERSION:
+        raise RecordingFormatError(f"Unsupported recording version {version}")
+    return table_size, count, duration * TIME_UNIT
+
+
+class BinaryRecording:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.readers = 0
+        self.closed = False
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        table_size, self.count, self.duration = read_header(self.data)
+
+        offset = HEADER.size
+        self.table = []
+        for _ in range(table_size):
+            length = self.data[offset]
+            self.table.append(self.data[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+        self.commands_offset = offset
+        self.times_offset = offset + self.count
+        if self.times_offset > len(self.data):
+            raise RecordingFormatError("Truncated recording")
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        with self.lock:
+            if self.closed:
+                raise ValueError(f"Recording {self.path} is closed")
+            self.readers += 1
+        try:
+            data = self.data
+            table = self.table
+            pos = self.times_offset
+            ticks = 0
+            for i in range(self.count):
+                value = 0
+                shift = 0
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    value |= (byte & 0x7F) << shift
+                    shift += 7
+                    if byte < 0x80:
+                        break
+                ticks += (value >> 1) ^ -(value & 1)
+                yield {'command': table[data[self.commands_offset + i]], 'time': ticks * TIME_UNIT}
+        finally:
+            with self.lock:
+                self.readers -= 1
+                if self.closed and not self.readers:
+                    self.unmap()
+
+    def close(self):
+        # Safe to call while a playback is still iterating: the mapping is released
+        # when the last reader finishes.
+        with self.lock:
+            self.closed = True
+            if not self.readers:
+                self.unmap()
+
+    def unmap(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+def describe(path):
+    with open(path, 'rb') as f:
+        _, count, duration = read_header(f.read(HEADER.size))
+    return count, duration
+
+
+def load_recording(path):
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return BinaryRecording(path)
+
+
+def save_recording(path, recording):
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(list(recording), f, indent=2)
+    else:
+        write_binary(path, recording)
+
+
+def convert(src, dst):
+    save_recording(dst, load_recording(src))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert recordings between JSON and the binary .btr format.")
+    parser.add_argument('src')
+    parser.add_argument('dst')
+    args = parser.parse_args()
+    convert(args.src, args.dst)
+    print(f"{args.src} ({os.path.getsize(args.src)} bytes) -> {args.dst} ({os.path.getsize(args.dst)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
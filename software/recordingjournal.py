@@ -0,0 +1,88 @@
+import os
+import threading
+
+JOURNAL_FILENAME = '.journal'
+
+
+def read_journal(path):
+    with open(path, 'r') as f:
+        for line in f:
+            # A crash can leave the last line half written; everything before it is intact.
+            if not line.endswith('\n'):
+                break
+            timestamp, cmd = line.rstrip('\n').split('\t', 1)
+            yield {'command': cmd, 'time': float(timestamp)}
+
+
+class RecordingJournal:
+    # append runs on the event loop and only touches the in-memory buffer; flush,
+    # which writes and fsyncs, belongs on an executor thread. lock guards the
+    # buffer and write_lock the file, so an append never waits for the disk.
+    def __init__(self, directory, batch_size=64):
+        self.path = os.path.join(directory, JOURNAL_FILENAME)
+        self.batch_size = batch_size
+        self.file = None
+        self.buffer = []
+        self.count = 0
+        self.start_time = None
+        self.lock = threading.Lock()
+        self.write_lock = threading.RLock()
+
+    def __len__(self):
+        return self.count
+
+    def has_data(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def start(self):
+        with self.write_lock:
+            self.close()
+            file = open(self.path, 'w')
+            with self.lock:
+                self.file = file
+                self.buffer = []
+                self.count = 0
+                self.start_time = None
+
+    def append(self, cmd, timestamp):
+        with self.lock:
+            if self.start_time is None:
+                self.start_time = timestamp
+            relative_time = timestamp - self.start_time
+            self.buffer.append(f"{relative_time!r}\t{cmd}\n")
+            self.count += 1
+            return relative_time
+
+    def full(self):
+        # True once a batch is waiting, so the flusher should not wait for its timer.
+        with self.lock:
+            return len(self.buffer) >= self.batch_size
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                batch, self.buffer = self.buffer, []
+                file = self.file
+            if file is None or not batch:
+                return
+            file.write(''.join(batch))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def close(self):
+        with self.write_lock:
+            if self.file is not None:
+                self.flush()
+                self.file.close()
+                self.file = None
+
+    def commands(self):
+        self.flush()
+        return read_journal(self.path)
+
+    def discard(self):
+        with self.write_lock:
+            self.close()
+            self.count = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import recordingformat
+
+INDEX_FILENAME = '.index.json'
+INDEX_VERSION = 2
+# When a name exists in both formats the binary file wins.
+EXTENSIONS = (recordingformat.EXTENSION, '.json')
+
+
+def close_recording(recording):
+    # Binary recordings hold a memory map of their file; JSON ones are plain lists.
+    if isinstance(recording, recordingformat.BinaryRecording):
+        recording.close()
+
+
+def scan_directory(directory):
+    # Maps each recording name to (extension, DirEntry), one file per name.
+    found = {}
+    for entry in os.scandir(directory):
+        if entry.name.startswith('.') or not entry.is_file():
+            continue
+        for rank, extension in enumerate(EXTENSIONS):
+            if entry.name.endswith(extension):
+                name = entry.name[:-len(extension)]
+                if name not in found or rank < found[name][0]:
+                    found[name] = (rank, extension, entry)
+                break
+    return {name: (extension, entry) for name, (_, extension, entry) in found.items()}
+
+
+class RecordingStore:
+    def __init__(self, directory, cache_size=16, save_extension=recordingformat.EXTENSION):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.save_extension = save_extension
+        self.index = {}
+        self.cache = OrderedDict()
+        self.lock = threading.RLock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.load_index()
+
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_FILENAME)
+
+    def path(self, name, extension=None):
+        if extension is None:
+            extension = self.index[name]['extension']
+        return os.path.join(self.directory, f"{name}{extension}")
+
+    def load_index(self):
+        try:
+            with open(self.index_path(), 'r') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self.index = data['recordings']
+        except (OSError, ValueError, KeyError):
+            self.index = {}
+
+    def save_index(self):
+        tmp_path = self.index_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'recordings': self.index}, f)
+        os.replace(tmp_path, self.index_path())
+
+    def scan(self):
+        return scan_directory(self.directory)
+
+    def refresh(self):
+        with self.lock:
+            errors = []
+            changed = False
+            found = self.scan()
+            for name, (extension, entry) in found.items():
+                stat = entry.stat()
+                info = self.index.get(name)
+                if (info and info['extension'] == extension and info['mtime'] == stat.st_mtime_ns
+                        and info['size'] == stat.st_size):
+                    continue
+                try:
+                    info = self.describe(entry.path, extension, stat)
+                except Exception as e:
+                    # Remember broken files too, so they are not re-parsed until they change.
+                    errors.append((name, e))
+                    info = {'extension': extension, 'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                            'error': str(e)}
+                self.index[name] = info
+                self.forget(name)
+                changed = True
+
+            for name in set(self.index) - set(found):
+                del self.index[name]
+                self.forget(name)
+                changed = True
+
+            if changed:
+                self.save_index()
+            return changed, errors
+
+    def describe(self, path, extension, stat):
+        if extension == recordingformat.EXTENSION:
+            count, duration = recordingformat.describe(path)
+        else:
+            with open(path, 'r') as f:
+                recording = json.load(f)
+            count = len(recording)
+            duration = recording[-1]['time'] if recording else 0
+        return {
+            'extension': extension,
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'commands': count,
+            'duration': duration,
+        }
+
+    def names(self):
+        with self.lock:
+            return sorted(name for name, info in self.index.items() if 'error' not in info)
+
+    def info(self, name):
+        with self.lock:
+            return self.index.get(name)
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.index and 'error' not in self.index[name]
+
+    def remember(self, name, recording):
+        self.cache[name] = recording
+        self.cache.move_to_end(name)
+        while len(self.cache) > self.cache_size:
+            close_recording(self.cache.popitem(last=False)[1])
+
+    def forget(self, name):
+        close_recording(self.cache.pop(name, None))
+
+    def load(self, name):
+        with self.lock:
+            if name in self.cache:
+                self.cache.move_to_end(name)
+                return self.cache[name]
+            if name not in self:
+                raise KeyError(name)
+            path = self.path(name)
+
+        if path.endswith(recordingformat.EXTENSION):
+            recording = recordingformat.BinaryRecording(path)
+        else:
+            with open(path, 'r') as f:
+                recording = json.load(f)
+
+        with self.lock:
+            if name in self.cache:
+                # Another thread loaded it first; keep theirs so only one mapping stays open.
+                close_recording(recording)
+                return self.cache[name]
+            self.remember(name, recording)
+        return recording
+
+    def save(self, name, recording):
+        path = self.path(name, self.save_extension)
+        with self.lock:
+            # Windows cannot replace a file that is still mapped.
+            self.forget(name)
+        if self.save_extension == recordingformat.EXTENSION:
+            recordingformat.write_binary(path, recording)
+        else:
+            with open(path, 'w') as f:
+                json.dump(list(recording), f, indent=2)
+        with self.lock:
+            self.remove_files(name, keep=path)
+            self.index[name] = self.describe(path, self.save_extension, os.stat(path))
+            self.forget(name)
+            self.save_index()
+
+    def remove_files(self, name, keep=None):
+        for extension in EXTENSIONS:
+            path = self.path(name, extension)
+            if path != keep and os.path.exists(path):
+                os.remove(path)
+
+    def delete(self, name):
+        with self.lock:
+            self.forget(name)
+            self.remove_files(name)
+            self.index.pop(name, None)
+            self.save_index()
@@ -0,0 +1,185 @@
+import argparse
+import csv
+import time
+from array import array
+from bisect import bisect_right
+
+from firmware import (BYTE_UNITS, CENTER, LINK_UNITS, UNITS_PER_MS, UPDATE_INTERVAL, UPDATE_PERIOD_MS, TurretModel,
+                      effective_state, link_arrivals)
+from optimizer import optimize
+from recordingformat import load_recording
+
+
+class Trajectory:
+    # Servo angles as change points: the turret holds (ud[i], lr[i]) from times[i]
+    # until times[i + 1]. Spin changes are kept the same way.
+    def __init__(self, ud=CENTER, lr=CENTER, spin=0):
+        self.times = array('d', [0.0])
+        self.ud = array('h', [ud])
+        self.lr = array('h', [lr])
+        self.spin_times = array('d', [0.0])
+        self.spin = array('b', [spin])
+        self.end = 0.0
+
+    def __len__(self):
+        return len(self.times)
+
+    def move(self, t, ud, lr):
+        self.times.append(t)
+        self.ud.append(ud)
+        self.lr.append(lr)
+
+    def set_spin(self, t, spin):
+        if spin != self.spin[-1]:
+            self.spin_times.append(t)
+            self.spin.append(spin)
+
+    def position(self, t):
+        i = bisect_right(self.times, t) - 1
+        return self.ud[i], self.lr[i]
+
+    def samples(self, interval=UPDATE_INTERVAL):
+        # Dense (t, ud, lr) rows, one per interval, e.g. one per firmware update.
+        i = 0
+        for n in range(int(self.end / interval) + 1):
+            t = n * interval
+            while i + 1 < len(self.times) and self.times[i + 1] <= t:
+                i += 1
+            yield t, self.ud[i], self.lr[i]
+
+    def export_csv(self, path, interval=None):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('time', 'ud', 'lr'))
+            if interval:
+                writer.writerows(self.samples(interval))
+            else:
+                writer.writerows(zip(self.times, self.ud, self.lr))
+
+    def plot(self, path=None, other=None, labels=('a', 'b')):
+        import matplotlib.pyplot as plt
+        figure, (pan_axis, tilt_axis) = plt.subplots(2, 1, sharex=True, figsize=(12, 6))
+        for trajectory, label in ((self, labels[0]), (other, labels[1])):
+            if trajectory is None:
+                continue
+            times = list(trajectory.times) + [trajectory.end]
+            pan_axis.step(times, list(trajectory.lr) + [trajectory.lr[-1]], where='post', label=label)
+            tilt_axis.step(times, list(trajectory.ud) + [trajectory.ud[-1]], where='post', label=label)
+        pan_axis.set_ylabel("lrPos (degrees)")
+        tilt_axis.set_ylabel("udPos (degrees)")
+        tilt_axis.set_xlabel("time (s)")
+        if other is not None:
+            pan_axis.legend()
+        if path:
+            figure.savefig(path)
+        else:
+            plt.show()
+        plt.close(figure)
+
+
+def replay(recording, speed=1.0, link=True, start=None):
+    # Plays recording through the firmware model on a virtual clock. With link on,
+    # bytes reach the sketch one at a time at the baud rate, as they would over Bluetooth.
+    # start is the (ud, lr, spin) the turret was left at, centered by default.
+    trajectory = Trajectory(*start) if start else Trajectory()
+    model = TurretModel(listener=lambda now_ms, ud, lr: trajectory.move(now_ms / 1000, ud, lr))
+    if start:
+        model.ud_pos, model.lr_pos, model.spin_on = start
+        model.target_ud, model.target_lr = start[:2]
+    for arrival, char in link_arrivals(recording, speed, BYTE_UNITS if link else 0):
+        model.advance(arrival // UNITS_PER_MS)
+        model.feed(char)
+        trajectory.set_spin(arrival / LINK_UNITS, model.spin_on)
+
+    # Run on until the servos reach their last targets.
+    while (model.ud_pos, model.lr_pos) != effective_state(model)[:2]:
+        model.advance(model.last_update + UPDATE_PERIOD_MS)
+    trajectory.end = model.now / 1000
+    return trajectory
+
+
+def compare(a, b, tolerance=0):
+    # Sweeps both change-point lists together; between events both positions are constant.
+    times = sorted(set(a.times) | set(b.times))
+    end = max(a.end, b.end)
+    max_error = 0
+    first_divergence = None
+    diverged = 0.0
+    i = j = 0
+    for k, t in enumerate(times):
+        while i + 1 < len(a.times) and a.times[i + 1] <= t:
+            i += 1
+        while j + 1 < len(b.times) and b.times[j + 1] <= t:
+            j += 1
+        error = max(abs(a.ud[i] - b.ud[j]), abs(a.lr[i] - b.lr[j]))
+        max_error = max(max_error, error)
+        if error > tolerance:
+            if first_divergence is None:
+                first_divergence = t
+            diverged += (times[k + 1] if k + 1 < len(times) else end) - t
+    return {
+        'max_error': max_error,
+        'first_divergence': first_divergence,
+        'diverged_time': diverged,
+        'same_final_position': (a.ud[-1], a.lr[-1]) == (b.ud[-1], b.lr[-1]),
+        'same_spin': list(a.spin) == list(b.spin),
+    }
+
+
+def describe(name, trajectory, elapsed):
+    print(f"{name}: {trajectory.end:.1f} s of motion, {len(trajectory) - 1} servo steps, "
+          f"final udPos {trajectory.ud[-1]} lrPos {trajectory.lr[-1]}, "
+          f"replayed in {elapsed * 1000:.0f} ms ({trajectory.end / max(elapsed, 1e-9):.0f}x real time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recordings through the firmware model on a virtual clock.")
+    parser.add_argument('recording')
+    parser.add_argument('other', nargs='?', help="second recording to compare against")
+    parser.add_argument('--optimized', action='store_true', help="compare against the recording's optimized form")
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--no-link', action='store_true', help="deliver commands instantly instead of at 9600 baud")
+    parser.add_argument('--tolerance', type=int, default=0, help="degrees of difference to ignore when comparing")
+    parser.add_argument('--csv', metavar='FILE', help="write the trajectory of the first recording as CSV")
+    parser.add_argument('--interval', type=float, help="sample the CSV every INTERVAL seconds instead of per change")
+    parser.add_argument('--plot', metavar='FILE', nargs='?', const='', help="plot with matplotlib, to FILE if given")
+    args = parser.parse_args()
+    if args.other and args.optimized:
+        parser.error("compare against either another recording or --optimized, not both")
+
+    recording = list(load_recording(args.recording))
+    started = time.perf_counter()
+    trajectory = replay(recording, args.speed, not args.no_link)
+    describe(args.recording, trajectory, time.perf_counter() - started)
+
+    other = None
+    if args.other or args.optimized:
+        other_name = args.other or f"{args.recording} (optimized)"
+        other_recording = list(load_recording(args.other)) if args.other else optimize(recording, link=not args.no_link)
+        started = time.perf_counter()
+        other = replay(other_recording, args.speed, not args.no_link)
+        describe(other_name, other, time.perf_counter() - started)
+
+        result = compare(trajectory, other, args.tolerance)
+        if result['first_divergence'] is None and result['same_spin']:
+            print("Trajectories match.")
+        else:
+            line = f"Trajectories differ: max {result['max_error']} degrees"
+            if result['first_divergence'] is not None:
+                line += f", first at {result['first_divergence']:.3f} s, {result['diverged_time']:.3f} s apart in total"
+            if not result['same_spin']:
+                line += ", spin differs"
+            line += ", final position " + ("matches" if result['same_final_position'] else "differs")
+            print(line)
+
+    if args.csv:
+        trajectory.export_csv(args.csv, args.interval)
+    if args.plot is not None:
+        try:
+            trajectory.plot(args.plot or None, other, labels=(args.recording, args.other or "optimized"))
+        except ImportError as e:
+            parser.exit(1, f"Plotting needs matplotlib: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
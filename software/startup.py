@@ -0,0 +1,4 @@
+import time
+
+# Imported first by the GUI, so the startup report includes the imports after it.
+STARTED = time.perf_counter()
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from protocol import StatusParser
+
+TELEMETRY_INTERVAL = 0.1
+
+
+class TelemetryReader:
+    # Reads status frames back from the turret on its own task, so nothing on the
+    # send path ever waits for a read.
+    def __init__(self, transport, on_status, on_error=None):
+        self.transport = transport
+        self.on_status = on_status
+        self.on_error = on_error
+        self.parser = StatusParser()
+        self.task = None
+        self.received = 0
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        try:
+            while True:
+                data = await self.transport.read_async()
+                if not data and not self.transport.is_open():
+                    raise ConnectionError("Connection closed while reading telemetry")
+                now = time.monotonic()
+                for status in self.parser.feed(data):
+                    self.received += 1
+                    self.on_status(status, now)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
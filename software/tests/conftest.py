@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules live flat in software/ and import each other by bare name.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+import random
+
+from estimator import TurretEstimator
+from firmware import TurretModel, effective_state
+
+
+def drive(start, commands):
+    # Sends single-character commands through the estimator to a turret that
+    # starts at start. Returns the turret, the estimator and every suppressed
+    # command that would in fact have changed what the turret does.
+    now = [0.0]
+    estimator = TurretEstimator(clock=lambda: now[0])
+    turret = TurretModel()
+    turret.target_ud, turret.target_lr = start
+    turret.ud_pos, turret.lr_pos = start
+    wrongly_suppressed = []
+    for cmd in commands:
+        now[0] += 0.2
+        if estimator.apply(cmd):
+            turret.feed(cmd)
+            continue
+        before = (turret.target_ud, turret.target_lr, turret.spin_on)
+        state = effective_state(turret)
+        turret.feed(cmd)
+        if effective_state(turret) != state:
+            wrongly_suppressed.append(cmd)
+        turret.target_ud, turret.target_lr, turret.spin_on = before
+    return turret, estimator, wrongly_suppressed
+
+
+def test_nothing_is_suppressed_before_the_position_is_known():
+    # The turret was left tilted down by an earlier session; a fresh estimator
+    # thinks it is centered and would drop the second 'u' at the clamp.
+    turret, estimator, wrongly_suppressed = drive((100, 90), ['u', 'u', 'l'])
+    assert effective_state(turret) == (80, 100, 0)
+    assert estimator.suppressed == 0
+    assert not wrongly_suppressed
+
+
+def test_suppression_after_centering_matches_the_firmware():
+    rng = random.Random(7)
+    suppressed = 0
+    for _ in range(50):
+        start = (rng.randrange(80, 101, 2), rng.randrange(0, 181, 2))
+        commands = [rng.choice('udlrsx') for _ in range(10)] + ['c']
+        commands += [rng.choice('udlrsx' * 2 + 'c' + 'uuuu' + 'llllllllll') for _ in range(60)]
+        turret, estimator, wrongly_suppressed = drive(start, commands)
+        assert not wrongly_suppressed
+        assert estimator.targets() == (turret.target_ud, turret.target_lr, turret.spin_on)
+        suppressed += estimator.suppressed
+    assert suppressed
+
+
+def test_centering_enables_suppression():
+    _, estimator, _ = drive((100, 90), ['u', 'c', 'u', 'u', 'u'])
+    assert estimator.suppressed == 2
+
+
+def test_sync_makes_the_position_known():
+    estimator = TurretEstimator(clock=lambda: 0.0)
+    assert estimator.apply('dd') == 'dd'
+    estimator.sync(100, 90, 0)
+    assert estimator.apply('d') == ''
@@ -0,0 +1,60 @@
+import asyncio
+
+from metrics import CommandMetrics, Histogram, QUANTILE_BUCKETS, percentile
+from transmitter import CommandTransmitter
+
+
+def test_quantile_close_to_percentile():
+    values = [i / 1000 for i in range(1, 1001)]
+    histogram = Histogram(QUANTILE_BUCKETS)
+    for value in values:
+        histogram.observe(value)
+    for fraction in (0.5, 0.95):
+        exact = percentile(values, fraction)
+        assert exact <= histogram.quantile(fraction) <= exact * 1.1
+
+
+def test_sends_without_queue_depth_leave_the_gauge():
+    metrics = CommandMetrics()
+    metrics.record_send('transmitter', 'u', 0.01, 0.001, 3)
+    metrics.record_send('other', 'l', 0.0, 0.001)
+    snapshot = metrics.snapshot()
+    assert snapshot['queue_depth'] == 3
+    assert snapshot['write_max'] == 0.001
+
+
+def test_merged_repeat_keeps_its_queueing_delay():
+    metrics = CommandMetrics()
+
+    async def main():
+        transmitter = CommandTransmitter(lambda data: asyncio.sleep(0), metrics=metrics,
+                                         move_interval=0.2, bytes_per_second=float('inf'))
+        transmitter.start()
+        transmitter.send('r')
+        await asyncio.sleep(0.01)
+        # Held back by the move interval until 0.2 s; replaced by 'l' on the way.
+        transmitter.send('u', replace=True)
+        await asyncio.sleep(0.1)
+        transmitter.send('l', replace=True)
+        await transmitter.drain()
+        await transmitter.stop()
+
+    asyncio.run(main())
+    assert metrics.commands_total == {'transmitter': 2}
+    assert metrics.snapshot()['latency_p95'] >= 0.18
+
+
+def test_bytes_count_what_was_written():
+    metrics = CommandMetrics()
+
+    async def main():
+        # Like framed mode, where every move becomes a 6-byte frame.
+        transmitter = CommandTransmitter(lambda data: asyncio.sleep(0), metrics=metrics, move_interval=0,
+                                         bytes_per_second=float('inf'), encode=lambda cmd: b'\xa5' + b'\x01' * 5)
+        transmitter.start()
+        for cmd in 'lrl':
+            await transmitter.send_wait(cmd)
+        await transmitter.stop()
+
+    asyncio.run(main())
+    assert metrics.bytes_total == {'transmitter': 18}
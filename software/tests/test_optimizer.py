@@ -0,0 +1,73 @@
+import random
+
+from optimizer import optimize, wire_bytes
+from replay import compare, replay
+
+
+def random_recording(rng, count):
+    # Mostly bursts: repeated timestamps and gaps far shorter than a servo move.
+    recording = []
+    t = 0.0
+    for _ in range(count):
+        t += rng.choice((0.0, 0.0, 0.001, 0.005, 0.01, 0.03, 0.08, 0.2, 1.0))
+        cmd = ''.join(rng.choice('udlrcsxud') for _ in range(rng.choice((1, 1, 1, 2, 3, 5))))
+        recording.append({'command': cmd, 'time': round(t, 4)})
+    return recording
+
+
+def assert_equivalent(recording, link=True, start=None):
+    optimized = optimize(recording, link=link)
+    result = compare(replay(recording, link=link, start=start), replay(optimized, link=link, start=start))
+    assert result['first_divergence'] is None, result
+    assert result['same_spin']
+    assert wire_bytes(optimized) <= wire_bytes(recording)
+    return optimized
+
+
+def test_drops_clamped_and_redundant_commands():
+    recording = [{'command': cmd, 'time': i * 0.5} for i, cmd in enumerate('cuuuuussxxc')]
+    optimized = assert_equivalent(recording)
+    # udPos stops at 80, so only the first 'u' moves anything and 'c' is one 'd' back.
+    assert [cmd_data['command'] for cmd_data in optimized] == ['c', 'u', 's', 'x', 'd']
+
+
+def test_keeps_everything_before_the_first_center():
+    # Left tilted down by an earlier session, the turret needs all three 'u's.
+    recording = [{'command': cmd, 'time': i * 0.5} for i, cmd in enumerate('uuuxx')]
+    assert optimize(recording) == recording
+    assert_equivalent(recording, start=(100, 90, 1))
+
+
+def test_random_recordings_from_anywhere():
+    rng = random.Random(10)
+    for _ in range(50):
+        start = (rng.randrange(80, 101, 2), rng.randrange(0, 181, 2), rng.randrange(2))
+        assert_equivalent(random_recording(rng, rng.randint(1, 200)), start=start)
+
+
+def test_burst_sent_at_one_instant():
+    # Queued on the link, these reach the sketch over several servo updates.
+    recording = [{'command': cmd, 'time': 1.0} for cmd in 'llllllrrrrlllluuuudddd']
+    assert_equivalent(recording)
+
+
+def test_spin_toggled_within_one_update():
+    assert_equivalent([{'command': 'sx', 'time': 0.0}, {'command': 'l', 'time': 0.0}])
+
+
+def test_random_bursty_recordings():
+    rng = random.Random(7)
+    for _ in range(100):
+        assert_equivalent(random_recording(rng, rng.randint(1, 200)))
+
+
+def test_random_recordings_without_link():
+    rng = random.Random(8)
+    for _ in range(50):
+        assert_equivalent(random_recording(rng, rng.randint(1, 200)), link=False)
+
+
+def test_merge_window_only_shrinks():
+    rng = random.Random(9)
+    recording = random_recording(rng, 300)
+    assert wire_bytes(optimize(recording, merge_window=0.5)) <= wire_bytes(optimize(recording))
@@ -0,0 +1,80 @@
+import asyncio
+from functools import partial
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import planner  # noqa: E402
+from firmware import CENTER, MOVE_INTERVAL, UD_MAX, UD_MIN, TurretModel, effective_state  # noqa: E402
+from playback import PlaybackEngine  # noqa: E402
+from replay import replay  # noqa: E402
+from transmitter import CommandTransmitter  # noqa: E402
+
+
+def test_quantize_snaps_to_the_reachable_grid():
+    grid = planner.quantize([(94, 96), (300, 300), (-40, 0), (CENTER, CENTER)])
+    # Steps of 10 degrees from center; tilt stops one step either side of it.
+    assert grid.tolist() == [[0, 1], [9, 1], [-9, -1], [0, 0]]
+
+
+def test_diagonal_moves_both_axes_together():
+    commands, times = planner.plan_path([(120, 100)])
+    assert commands.tolist() == ['dl', 'l', 'l']
+    assert times.tolist() == pytest.approx([0, MOVE_INTERVAL, 2 * MOVE_INTERVAL])
+
+
+def test_one_command_per_step_at_the_move_interval():
+    commands, times = planner.plan_path([(180, CENTER), (0, CENTER)])
+    assert commands.tolist() == ['l'] * 9 + ['r'] * 18
+    assert np.diff(times) == pytest.approx(np.full(26, MOVE_INTERVAL))
+    assert planner.TICK_INTERVAL == MOVE_INTERVAL
+
+
+def test_waypoint_times_delay_everything_after_them():
+    # The second waypoint may not start before 1 s; the third asks for 0.5 s but
+    # cannot start before the second is done, and the fourth is already late.
+    points = [(110, CENTER), (130, CENTER), (120, CENTER), (100, CENTER)]
+    commands, times = planner.plan_path(points, times=[0.0, 1.0, 0.5, 0.2])
+    assert commands.tolist() == ['l', 'l', 'l', 'l', 'r', 'r', 'r']
+    step = MOVE_INTERVAL
+    assert times.tolist() == pytest.approx([0, step] + [1.0 + i * step for i in range(5)])
+
+
+def test_unchanged_waypoints_are_skipped():
+    commands, times = planner.plan_path([(CENTER, CENTER), (CENTER + 4, CENTER)], times=[5.0, 6.0])
+    assert commands.tolist() == [] and times.tolist() == []
+
+
+def test_replay_ends_on_the_requested_targets():
+    points = planner.figure_eight(width=60, height=20, samples=16)
+    recording = planner.compile_path(points)
+    assert recording[0]['command'] == 'c'
+    trajectory = replay(recording)
+    pan, tilt = (planner.quantize(points[-1])[0] * 10 + CENTER).tolist()
+    assert (trajectory.lr[-1], trajectory.ud[-1]) == (pan, max(UD_MIN, min(UD_MAX, tilt)))
+
+
+def test_compiled_path_plays_through_the_transmitter():
+    recording = planner.compile_path([(130, 100), (110, 80)])
+    written = []
+
+    async def write(data):
+        written.append(data)
+
+    async def main():
+        transmitter = CommandTransmitter(write, move_interval=MOVE_INTERVAL)
+        transmitter.start()
+        engine = PlaybackEngine(recording, partial(transmitter.send_wait, timed=True))
+        stats = await engine.run()
+        await transmitter.stop()
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats['max_lateness'] < MOVE_INTERVAL / 2
+    sent = b''.join(written).decode()
+    assert sent == ''.join(cmd_data['command'] for cmd_data in recording)
+    model = TurretModel()
+    for char in sent:
+        model.feed(char)
+    assert effective_state(model) == (80, 110, 0)
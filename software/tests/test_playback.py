@@ -0,0 +1,27 @@
+import asyncio
+from functools import partial
+
+from firmware import MOVE_INTERVAL
+from playback import PlaybackEngine
+from transmitter import CommandTransmitter
+
+
+def test_recorded_moves_keep_their_own_timing():
+    # Moves recorded 20 ms apart, far closer than the live move interval.
+    recording = [{'command': 'lr'[i % 2], 'time': i * 0.02} for i in range(50)]
+    written = []
+
+    async def write(data):
+        written.append(data)
+
+    async def main():
+        transmitter = CommandTransmitter(write, move_interval=MOVE_INTERVAL)
+        transmitter.start()
+        engine = PlaybackEngine(recording, partial(transmitter.send_wait, timed=True))
+        stats = await engine.run()
+        await transmitter.stop()
+        return stats
+
+    stats = asyncio.run(main())
+    assert len(written) == 50
+    assert stats['max_lateness'] < MOVE_INTERVAL / 2
@@ -0,0 +1,56 @@
+import random
+
+import protocol
+from firmware import TurretModel
+
+
+def deliver(model, data):
+    reply = b''
+    for byte in data:
+        reply += model.receive(byte)[1]
+    return reply
+
+
+def test_hello_round_trip():
+    model = TurretModel()
+    assert protocol.parse_hello(deliver(model, protocol.hello())) == protocol.PROTOCOL_VERSION
+
+
+def test_position_frames_round_trip():
+    rng = random.Random(4)
+    model = TurretModel()
+    encoder = protocol.FrameEncoder()
+    # More frames than sequence numbers, so seq wraps.
+    for _ in range(3 * protocol.SEQ_MODULO):
+        pan, tilt, spin = rng.randrange(0, 181, 2), rng.randrange(0, 181, 2), rng.randrange(2)
+        deliver(model, encoder.encode(pan, tilt, spin))
+        assert (model.target_lr, model.target_ud, model.spin_on) == (pan, tilt, spin)
+    assert model.lost_frames == model.bad_frames == 0
+
+
+def test_hello_restarts_the_sequence():
+    model = TurretModel()
+    deliver(model, protocol.FrameEncoder().encode(100, 90, 0))
+    # A controller reconnecting numbers its frames from 0 again.
+    deliver(model, protocol.hello())
+    deliver(model, protocol.FrameEncoder().encode(60, 84, 1))
+    assert (model.target_lr, model.target_ud, model.spin_on) == (60, 84, 1)
+    assert model.lost_frames == 0
+
+
+def test_status_round_trip():
+    model = TurretModel()
+    deliver(model, protocol.telemetry(100))
+    assert model.telemetry_interval == 100
+    deliver(model, protocol.FrameEncoder().encode(120, 80, 1))
+    model.advance(2000)
+    statuses = protocol.StatusParser().feed(model.poll_status(2000))
+    assert statuses == [{
+        'ud_pos': model.ud_pos,
+        'lr_pos': model.lr_pos,
+        'spin_on': 1,
+        'at_target': True,
+        'pot': model.pot,
+        'loop_ms': model.loop_ms,
+        'seq': 0,
+    }]
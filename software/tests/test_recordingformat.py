@@ -0,0 +1,101 @@
+import json
+import os
+
+import recordingformat
+from recordingformat import BinaryRecording, RecordingFormatError, load_recording, save_recording
+from recordinganalytics import recording_files
+from recordingstore import RecordingStore, scan_directory
+
+RECORDING = [
+    {'command': 'u', 'time': 0.0},
+    {'command': 'ul', 'time': 0.080001},
+    {'command': 's', 'time': 0.5},
+    {'command': 'c', 'time': 0.5},
+    {'command': 'x', 'time': 3600.25},
+]
+
+
+def test_binary_round_trip(tmp_path):
+    path = str(tmp_path / 'show.btr')
+    save_recording(path, RECORDING)
+    recording = load_recording(path)
+    try:
+        assert len(recording) == len(RECORDING)
+        assert recording.duration == RECORDING[-1]['time']
+        loaded = list(recording)
+        assert [cmd_data['command'] for cmd_data in loaded] == [cmd_data['command'] for cmd_data in RECORDING]
+        for cmd_data, original in zip(loaded, RECORDING):
+            assert abs(cmd_data['time'] - original['time']) <= recordingformat.TIME_UNIT
+    finally:
+        recording.close()
+
+
+def test_json_to_binary_to_json(tmp_path):
+    src = str(tmp_path / 'show.json')
+    with open(src, 'w') as f:
+        json.dump(RECORDING, f)
+    recordingformat.convert(src, str(tmp_path / 'show.btr'))
+    recordingformat.convert(str(tmp_path / 'show.btr'), str(tmp_path / 'back.json'))
+    with open(tmp_path / 'back.json') as f:
+        back = json.load(f)
+    assert [cmd_data['command'] for cmd_data in back] == [cmd_data['command'] for cmd_data in RECORDING]
+
+
+def test_empty_recording(tmp_path):
+    path = str(tmp_path / 'empty.btr')
+    save_recording(path, [])
+    recording = load_recording(path)
+    assert list(recording) == []
+    recording.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'bogus.btr'
+    path.write_bytes(b'not a recording at all')
+    try:
+        BinaryRecording(str(path))
+    except RecordingFormatError:
+        pass
+    else:
+        raise AssertionError("expected RecordingFormatError")
+
+
+def test_close_waits_for_readers(tmp_path):
+    path = str(tmp_path / 'show.btr')
+    save_recording(path, RECORDING)
+    recording = BinaryRecording(path)
+    reader = iter(recording)
+    first = next(reader)
+    recording.close()
+    assert not recording.data.closed
+    assert [first] + list(reader) == list(load_recording(path))
+    assert recording.data.closed
+
+
+def test_store_closes_evicted_deleted_and_replaced(tmp_path):
+    store = RecordingStore(str(tmp_path), cache_size=1)
+    store.save('a', RECORDING)
+    store.save('b', RECORDING)
+    a = store.load('a')
+    b = store.load('b')
+    assert a.data.closed and not b.data.closed
+
+    store.save('b', RECORDING[:2])
+    assert b.data.closed
+    assert len(store.load('b')) == 2
+
+    b = store.load('b')
+    store.delete('b')
+    assert b.data.closed
+    assert not os.path.exists(tmp_path / 'b.btr')
+
+
+def test_analytics_and_store_see_the_same_files(tmp_path):
+    save_recording(str(tmp_path / 'show.btr'), RECORDING)
+    save_recording(str(tmp_path / 'show.json'), RECORDING)
+    save_recording(str(tmp_path / 'other.json'), RECORDING)
+    os.mkdir(tmp_path / 'folder.json')
+    (tmp_path / '.hidden.json').write_text('[]')
+    found = scan_directory(str(tmp_path))
+    assert {name: extension for name, (extension, _) in found.items()} == {'show': '.btr', 'other': '.json'}
+    assert recording_files(str(tmp_path)) == sorted(entry.path for _, entry in found.values())
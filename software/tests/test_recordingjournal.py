@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+from recordingjournal import RecordingJournal, read_journal
+from recordingstore import RecordingStore
+from turretcore import TurretCore
+
+
+def write_torn_journal(directory):
+    journal = RecordingJournal(str(directory))
+    journal.start()
+    for i, cmd in enumerate('udls'):
+        journal.append(cmd, 100.0 + i * 0.25)
+    journal.flush()
+    # The process dies part way through writing the next line.
+    journal.file.write("1.0\tr")
+    journal.file.flush()
+    journal.file.close()
+    journal.file = None
+    return journal.path
+
+
+def test_read_stops_at_torn_line(tmp_path):
+    path = write_torn_journal(tmp_path)
+    assert list(read_journal(path)) == [
+        {'command': 'u', 'time': 0.0},
+        {'command': 'd', 'time': 0.25},
+        {'command': 'l', 'time': 0.5},
+        {'command': 's', 'time': 0.75},
+    ]
+
+
+def test_core_recovers_torn_journal(tmp_path):
+    write_torn_journal(tmp_path)
+    core = TurretCore(str(tmp_path))
+    name = asyncio.run(core.recover_journal())
+
+    assert name is not None
+    assert not core.journal.has_data()
+    store = RecordingStore(str(tmp_path))
+    store.refresh()
+    assert [cmd_data['command'] for cmd_data in store.load(name)] == list('udls')
+
+
+def test_nothing_to_recover(tmp_path):
+    core = TurretCore(str(tmp_path))
+    assert asyncio.run(core.recover_journal()) is None
+
+
+def test_append_does_not_wait_for_the_disk(tmp_path):
+    journal = RecordingJournal(str(tmp_path), batch_size=2)
+    journal.start()
+    writing, release = threading.Event(), threading.Event()
+    real_write = journal.file.write
+
+    def slow_write(data):
+        writing.set()
+        release.wait()
+        return real_write(data)
+
+    journal.file.write = slow_write
+    journal.append('u', 100.0)
+    flusher = threading.Thread(target=journal.flush)
+    flusher.start()
+    writing.wait()
+    # The flusher is stuck in write; appends still go straight to the buffer.
+    journal.append('d', 100.5)
+    journal.append('l', 101.0)
+    assert journal.full()
+    release.set()
+    flusher.join()
+    assert [cmd['command'] for cmd in journal.commands()] == ['u', 'd', 'l']
+    journal.discard()
@@ -0,0 +1,38 @@
+import asyncio
+import threading
+import time
+
+from protocol import SEQ_MODULO, status
+from telemetry import TelemetryReader
+from transport import LoopbackTransport
+
+
+def test_restarted_reader_loses_no_status_frame():
+    host, turret = LoopbackTransport.pair()
+    count = 200
+
+    def write():
+        for i in range(count):
+            # Split each frame so cancels also land in the middle of one.
+            frame = status(90, 90 + i % 2 * 2, 0, False, 512, 3, i % SEQ_MODULO)
+            turret.write(frame[:3])
+            turret.write(frame[3:])
+            time.sleep(0.0005)
+        turret.close()
+
+    async def main():
+        seqs = []
+        closed = asyncio.Event()
+        reader = TelemetryReader(host, lambda s, now: seqs.append(s['seq']), on_error=lambda e: closed.set())
+        writer = threading.Thread(target=write)
+        writer.start()
+        while writer.is_alive():
+            reader.start()
+            await asyncio.sleep(0.001)
+            await reader.stop()
+        reader.start()
+        await asyncio.wait_for(closed.wait(), 1.0)
+        await reader.stop()
+        return seqs
+
+    assert asyncio.run(main()) == [i % SEQ_MODULO for i in range(count)]
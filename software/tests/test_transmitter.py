@@ -0,0 +1,93 @@
+import asyncio
+
+from transmitter import CommandTransmitter
+
+
+def run_transmitter(sends, maxlen=32):
+    written = []
+
+    async def write(data):
+        written.append(data.decode())
+
+    async def main():
+        transmitter = CommandTransmitter(write, maxlen=maxlen, move_interval=0, bytes_per_second=float('inf'))
+        transmitter.start()
+        # Everything is queued before the task gets a chance to run.
+        results = [transmitter.send(cmd, replace) for cmd, replace in sends]
+        await transmitter.drain()
+        await transmitter.stop()
+        return transmitter, results
+
+    transmitter, results = asyncio.run(main())
+    return written, transmitter, results
+
+
+def test_clicks_are_never_merged():
+    written, transmitter, _ = run_transmitter([('u', False), ('u', False), ('l', False)])
+    assert written == ['u', 'u', 'l']
+    assert transmitter.merged == 0
+
+
+def test_joystick_repeats_replace_each_other():
+    written, transmitter, _ = run_transmitter([('u', True), ('ul', True), ('l', True)])
+    assert written == ['l']
+    assert transmitter.merged == 2
+
+
+def test_repeat_does_not_replace_a_click():
+    written, _, _ = run_transmitter([('u', False), ('l', True), ('r', False), ('d', True), ('dr', True)])
+    assert written == ['u', 'l', 'r', 'dr']
+
+
+def test_full_queue_drops_repeats_before_clicks():
+    sends = [('l', True), ('u', False), ('u', False), ('c', False), ('s', False)]
+    written, transmitter, results = run_transmitter(sends, maxlen=3)
+    assert written == ['u', 'u', 'c']
+    assert results == [True, True, True, True, False]
+    assert transmitter.dropped == 2
+
+
+def test_coalesce_joins_moves_queued_while_busy():
+    written = []
+
+    async def write(data):
+        written.append(data.decode())
+
+    async def main():
+        transmitter = CommandTransmitter(write, move_interval=0.05, bytes_per_second=float('inf'), coalesce=True)
+        transmitter.start()
+        first = asyncio.ensure_future(transmitter.send_wait('u'))
+        await asyncio.sleep(0.01)
+        # The move interval keeps the link busy; these wait and go out together.
+        waits = [asyncio.ensure_future(transmitter.send_wait(cmd)) for cmd in ('u', 'l', 's')]
+        results = await asyncio.gather(first, *waits)
+        await transmitter.stop()
+        return transmitter, results
+
+    transmitter, results = asyncio.run(main())
+    assert written == ['u', 'uls']
+    assert results == [True] * 4
+    assert transmitter.coalesced == 2
+
+
+def test_timed_moves_merge_only_when_closer_than_a_step():
+    written = []
+
+    async def write(data):
+        written.append(data.decode())
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        transmitter = CommandTransmitter(write, move_interval=0.05, frame_interval=0.2,
+                                         bytes_per_second=float('inf'), coalesce=True)
+        transmitter.start()
+        start = loop.time()
+        for cmd, at in (('l', 0.0), ('l', 0.01), ('u', 0.02), ('r', 0.1), ('d', 0.2)):
+            await asyncio.sleep(start + at - loop.time())
+            transmitter.send(cmd, timed=True)
+        await transmitter.drain()
+        await transmitter.stop()
+
+    asyncio.run(main())
+    # The two moves inside the first step go out together; the rest keep their spacing.
+    assert written == ['l', 'lu', 'r', 'd']
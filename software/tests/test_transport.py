@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from transport import LoopbackTransport
+
+
+class NoExecutor(ThreadPoolExecutor):
+    def submit(self, fn, *args, **kwargs):
+        raise AssertionError("loopback reads must not need an executor thread")
+
+
+def test_cancelled_reads_lose_nothing():
+    host, turret = LoopbackTransport.pair()
+    sent = bytes(i % 128 for i in range(300))
+
+    def write():
+        for i in range(0, len(sent), 3):
+            turret.write(sent[i:i + 3])
+            time.sleep(0.0005)
+        turret.close()
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(NoExecutor())
+        threading.Thread(target=write).start()
+        received = b''
+        while True:
+            try:
+                data = await asyncio.wait_for(host.read_async(2), 0.0002)
+            except asyncio.TimeoutError:
+                continue
+            if not data:
+                return received
+            received += data
+
+    assert asyncio.run(main()) == sent
+
+
+def test_read_returns_empty_once_peer_closes():
+    host, turret = LoopbackTransport.pair()
+
+    async def main():
+        read = asyncio.create_task(host.read_async())
+        await asyncio.sleep(0.01)
+        turret.close()
+        return await asyncio.wait_for(read, 1.0)
+
+    assert asyncio.run(main()) == b''
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import turretcore
+from firmware import BYTES_PER_SECOND, TurretModel
+from transport import LoopbackTransport
+from turretcore import TurretLink
+from turretsim import SimulatedTurret
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+class SteadyTurret:
+    # One turret model that outlives every connection to it, like a turret that
+    # keeps its power while the Bluetooth link drops.
+    def __init__(self):
+        self.model = TurretModel()
+        self.started = time.monotonic()
+        self.ends = []
+
+    def open(self, port, timeout=5, nonblocking=False):
+        host, end = LoopbackTransport.pair()
+        host.port = port
+        simulator = SimulatedTurret(end)
+        simulator.model = self.model
+        simulator.start()
+        simulator.start_time = self.started
+        self.ends.append(end)
+        return host
+
+
+def test_write_error_keeps_queue_and_estimate(monkeypatch):
+    turret = SteadyTurret()
+    monkeypatch.setattr(turretcore, 'open_transport', turret.open)
+
+    async def main():
+        link = TurretLink(protocol='framed', telemetry=0.05)
+        await link.connect('turret')
+        for cmd in 'lll':
+            link.send_nowait(cmd)
+        await wait_for(lambda: turret.model.lr_pos == 120 and link.status and link.status['lr_pos'] == 120)
+
+        # Drop the link with a move in flight and two more behind it.
+        turret.ends[-1].close()
+        for cmd in 'lll':
+            link.send_nowait(cmd)
+        await wait_for(lambda: link.reconnects == 1 and turret.model.lr_pos == 150)
+        estimate = link.estimator.targets()
+        # A move after the reconnect starts from where the turret really is.
+        link.send_nowait('r')
+        await wait_for(lambda: turret.model.lr_pos == 140)
+        await link.disconnect()
+        return estimate
+
+    assert asyncio.run(main()) == (90, 150, 0)
+
+
+def test_scan_takes_the_first_port_to_answer(monkeypatch):
+    opened = []
+
+    def open_transport(port, timeout=5, nonblocking=False):
+        host, end = LoopbackTransport.pair()
+        host.port = port
+        if port != 'silent':
+            # At 30 bytes/s the slow turret's hello reply takes 100 ms to arrive.
+            SimulatedTurret(end, bytes_per_second=BYTES_PER_SECOND if port == 'fast' else 30).start()
+        opened.append(host)
+        return host
+
+    monkeypatch.setattr(turretcore, 'open_transport', open_transport)
+    monkeypatch.setattr(turretcore, 'list_ports', lambda: ['slow', 'fast', 'silent'])
+
+    async def main():
+        link = TurretLink(scan=True, telemetry=0)
+        await link.connect('silent')
+        found = link.port, link.framed
+        await link.disconnect()
+        return found
+
+    assert asyncio.run(main()) == ('fast', True)
+    assert len(opened) == 3
+    assert all(transport.closed for transport in opened)
+
+
+def test_scan_falls_back_to_the_given_port(monkeypatch):
+    def open_transport(port, timeout=5, nonblocking=False):
+        host, _ = LoopbackTransport.pair()
+        host.port = port
+        return host
+
+    monkeypatch.setattr(turretcore, 'open_transport', open_transport)
+    monkeypatch.setattr(turretcore, 'list_ports', lambda: ['other'])
+
+    async def main():
+        link = TurretLink(scan=True, telemetry=0)
+        await link.connect('legacy')
+        found = link.port, link.framed
+        await link.disconnect()
+        return found
+
+    assert asyncio.run(main()) == ('legacy', False)
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from collections import deque
+
+from firmware import BYTES_PER_SECOND, FRAME_INTERVAL, MOVE_INTERVAL, is_direction
+
+
+class CommandTransmitter:
+    def __init__(self, write, on_sent=None, on_error=None, maxlen=32,
+                 move_interval=MOVE_INTERVAL, bytes_per_second=BYTES_PER_SECOND, metrics=None, encode=str.encode,
+                 coalesce=False, frame_interval=FRAME_INTERVAL):
+        # write is a coroutine function taking bytes, e.g. a transport's write_async.
+        # encode turns a command into the bytes put on the wire. With coalesce on,
+        # everything queued while the link was busy goes out as one command, for
+        # encoders that send absolute targets rather than single steps. Moves then
+        # go out at most once per frame_interval instead of once per move_interval.
+        self.write = write
+        self.encode = encode
+        self.coalesce = coalesce
+        self.frame_interval = frame_interval
+        self.metrics = metrics
+        self.on_sent = on_sent
+        self.on_error = on_error
+        self.maxlen = maxlen
+        self.move_interval = move_interval
+        self.bytes_per_second = bytes_per_second
+
+        self.queue = deque()
+        self.wakeup = None
+        self.idle = None
+        self.task = None
+        self.current = []
+
+        self.next_byte_time = 0
+        self.last_move_time = 0
+        self.sent = 0
+        self.suppressed = 0
+        self.merged = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self.wakeup = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        self.abandon()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+        for done in self.current:
+            done.cancel()
+        self.current = []
+        if self.idle is not None:
+            self.idle.set()
+
+    def abandon(self, e=None):
+        # Clears the queue, failing anyone waiting in send_wait.
+        for item in self.queue:
+            if item[3] is not None and not item[3].done():
+                if e is None:
+                    item[3].cancel()
+                else:
+                    item[3].set_exception(e)
+        self.queue.clear()
+
+    def send(self, cmd, replace=False, done=None, timed=False):
+        # replace marks a repeat from the joystick or a held button: while unsent it
+        # is stale as soon as the next one arrives. Anything else, such as a button
+        # click, always reaches the turret. timed marks a command whose timing was
+        # already set, e.g. by a recording: it waits for the link but not for the
+        # move interval, which would otherwise make playback fall behind.
+        if not cmd or not self.running:
+            return False
+        if replace and self.queue and self.queue[-1][2]:
+            # Keep the original enqueue time so the latency metrics still see the wait.
+            self.queue[-1] = (cmd, self.queue[-1][1], True, None, timed)
+            self.merged += 1
+        else:
+            if len(self.queue) >= self.maxlen and not self.drop_replaceable():
+                self.dropped += 1
+                return False
+            self.queue.append((cmd, time.monotonic(), replace, done, timed))
+        self.idle.clear()
+        self.wakeup.set()
+        return True
+
+    async def send_wait(self, cmd, timed=False):
+        # Queues cmd behind whatever is already waiting and returns once it has been
+        # written, so playback and live input share one queue.
+        done = asyncio.get_running_loop().create_future()
+        if not self.send(cmd, done=done, timed=timed):
+            return False
+        return await done
+
+    def drop_replaceable(self):
+        for i, item in enumerate(self.queue):
+            if item[2]:
+                del self.queue[i]
+                self.dropped += 1
+                return True
+        return False
+
+    def settle(self, result):
+        for done in self.current:
+            if not done.done():
+                done.set_result(result)
+        self.current = []
+
+    def take(self):
+        # Pops the next command, or with coalesce on every queued one, joined into
+        # a single command in the order they were queued.
+        cmd, enqueued_at, _, done, _ = self.queue.popleft()
+        self.current = [done] if done is not None else []
+        while self.coalesce and self.queue:
+            more, _, _, done, _ = self.queue.popleft()
+            cmd += more
+            if done is not None:
+                self.current.append(done)
+            self.coalesced += 1
+        return cmd, enqueued_at
+
+    def move_gap(self, item):
+        # How long after the previous move this queued item may go out. A timed
+        # command already carries its own timing, so it only waits for the link,
+        # or with coalesce on for as long as one step takes the servos: anything
+        # closer than that is merged into one frame, which the turret could not
+        # follow any faster. Live moves with coalesce on wait a whole frame
+        # interval, so a held direction costs one frame per several steps.
+        cmd, _, _, _, timed = item
+        if not self.paced(cmd):
+            return 0
+        if timed:
+            return self.move_interval if self.coalesce else 0
+        return self.frame_interval if self.coalesce else self.move_interval
+
+    def paced(self, cmd):
+        # A coalesced command waits for the move interval if any part of it moves.
+        if self.coalesce:
+            return any(is_direction(char) for char in cmd)
+        return is_direction(cmd)
+
+    def pending(self):
+        return len(self.queue)
+
+    async def drain(self):
+        if self.running:
+            await self.idle.wait()
+
+    async def run(self):
+        while True:
+            if not self.queue:
+                self.idle.set()
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            waiting = self.queue if self.coalesce else (self.queue[0],)
+            # A move is due once the one before it has had its interval, counted
+            # from when that one was due rather than from when its write finished,
+            # so waits never add up.
+            due = max(self.queue[0][1], self.last_move_time + max(self.move_gap(item) for item in waiting))
+            ready = max(self.next_byte_time, due)
+            delay = ready - time.monotonic()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            cmd, enqueued_at = self.take()
+            depth = len(self.queue)
+
+            write_start = time.monotonic()
+            try:
+                data = self.encode(cmd)
+                if not data:
+                    # The encoder found nothing in cmd that would move the turret.
+                    self.suppressed += 1
+                    self.settle(True)
+                    continue
+                await self.write(data)
+            except Exception as e:
+                for done in self.current:
+                    if not done.done():
+                        done.set_exception(e)
+                self.current = []
+                self.abandon(e)
+                self.idle.set()
+                if self.on_error:
+                    self.on_error(e)
+                return
+            self.settle(True)
+
+            now = time.monotonic()
+            if self.metrics:
+                self.metrics.record_send('transmitter', cmd, write_start - enqueued_at, now - write_start, depth,
+                                         len(data))
+            self.next_byte_time = now + len(data) / self.bytes_per_second
+            if self.paced(cmd):
+                self.last_move_time = due
+            self.sent += 1
+            if self.on_sent:
+                self.on_sent(cmd, time.time())
@@ -0,0 +1,189 @@
+import asyncio
+import queue
+import sys
+import threading
+import time
+
+from firmware import BAUD_RATE
+
+SIM_PREFIX = 'sim://'
+
+
+class SerialTransport:
+    def __init__(self, port, baudrate=BAUD_RATE, timeout=5, nonblocking=False):
+        import serial
+        self.port = port
+        # Zero timeouts make pyserial return whatever it could read or write instead of blocking.
+        self.serial = serial.Serial(port, baudrate, timeout=0 if nonblocking else timeout,
+                                    write_timeout=0 if nonblocking else None)
+        self.timeout_error = serial.SerialTimeoutException
+        self.write_lock = None
+
+    def write(self, data):
+        return self.serial.write(data)
+
+    async def write_async(self, data):
+        loop = asyncio.get_running_loop()
+        fd = getattr(self.serial, 'fd', None)
+        if fd is None or self.serial.write_timeout != 0:
+            return await loop.run_in_executor(None, self.serial.write, data)
+
+        if self.write_lock is None:
+            self.write_lock = asyncio.Lock()
+        async with self.write_lock:
+            remaining = bytes(data)
+            while remaining:
+                try:
+                    written = self.serial.write(remaining) or 0
+                except self.timeout_error:
+                    written = 0
+                remaining = remaining[written:]
+                if remaining:
+                    writable = loop.create_future()
+                    loop.add_writer(fd, lambda: writable.done() or writable.set_result(None))
+                    try:
+                        await writable
+                    finally:
+                        loop.remove_writer(fd)
+        return len(data)
+
+    def read(self, size=1):
+        return self.serial.read(size)
+
+    async def read_async(self, size=1024):
+        loop = asyncio.get_running_loop()
+        fd = getattr(self.serial, 'fd', None)
+        if fd is None or self.serial.timeout != 0:
+            data = await loop.run_in_executor(None, self.serial.read, size)
+            while not data and self.serial.timeout == 0:
+                # No fd to wait on (e.g. Windows), so poll.
+                await asyncio.sleep(0.01)
+                data = await loop.run_in_executor(None, self.serial.read, size)
+            return data
+
+        readable = loop.create_future()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+        return self.serial.read(size)
+
+    def is_open(self):
+        return self.serial.is_open
+
+    def close(self):
+        self.serial.close()
+
+
+class LoopbackTransport:
+    # An in-process link between two ends. The simulator's thread blocks in
+    # receive(); the event loop side waits in read_async() on a future that the
+    # writer resolves, so reading holds no executor thread and a cancelled read
+    # leaves everything not yet returned in the queue.
+    def __init__(self):
+        self.port = 'loopback'
+        self.peer = None
+        self.incoming = queue.Queue()
+        self.buffer = b''
+        self.closed = False
+        self.waiter = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def pair(cls):
+        a, b = cls(), cls()
+        a.peer, b.peer = b, a
+        return a, b
+
+    def write(self, data):
+        if not self.is_open():
+            raise OSError("Loopback transport is closed")
+        self.peer.incoming.put((time.monotonic(), bytes(data)))
+        self.peer.wake()
+        return len(data)
+
+    async def write_async(self, data):
+        return self.write(data)
+
+    def wake(self):
+        # Called from whichever thread wrote or closed.
+        waiter = self.waiter
+        if waiter is not None:
+            waiter.get_loop().call_soon_threadsafe(lambda: waiter.done() or waiter.set_result(None))
+
+    async def read_async(self, size=1024):
+        while not self.buffer:
+            chunk = self.receive(0)
+            if chunk is not None:
+                self.buffer += chunk[1]
+                continue
+            if not self.is_open():
+                return b''
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                # A write that landed before the waiter was set would not have woken us.
+                if self.incoming.empty() and self.is_open():
+                    await self.waiter
+            finally:
+                self.waiter = None
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def receive(self, timeout=None):
+        try:
+            if timeout == 0:
+                return self.incoming.get_nowait()
+            return self.incoming.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def read(self, size=1, timeout=None):
+        with self.lock:
+            while len(self.buffer) < size:
+                chunk = self.receive(timeout)
+                if chunk is None:
+                    break
+                self.buffer += chunk[1]
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+            return data
+
+    def is_open(self):
+        return not self.closed and self.peer is not None and not self.peer.closed
+
+    def close(self):
+        self.closed = True
+        self.wake()
+        if self.peer is not None:
+            self.peer.wake()
+
+
+def load_serial():
+    # pyserial is imported on first use; this lets a GUI pay that cost off its own thread.
+    import serial
+    import serial.tools.list_ports
+    return list_ports()
+
+
+def is_serial_error(e):
+    serial = sys.modules.get('serial')
+    return serial is not None and isinstance(e, serial.SerialException)
+
+
+def list_ports():
+    try:
+        from serial.tools import list_ports as serial_ports
+    except ImportError:
+        return []
+    return [info.device for info in serial_ports.comports()]
+
+
+def open_transport(port, baudrate=BAUD_RATE, timeout=5, nonblocking=False):
+    if port.startswith(SIM_PREFIX):
+        from turretsim import SimulatedTurret
+        host, turret = LoopbackTransport.pair()
+        host.port = port
+        host.simulator = SimulatedTurret(turret)
+        host.simulator.start()
+        return host
+    return SerialTransport(port, baudrate, timeout, nonblocking)
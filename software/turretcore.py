@@ -0,0 +1,545 @@
+import argparse
+import asyncio
+import threading
+import time
+from functools import partial
+
+import protocol
+from estimator import TurretEstimator
+from firmware import UPDATE_DELAY_MS
+from metrics import CommandMetrics
+from playback import PlaybackEngine
+from protocol import SEQ_MODULO
+from recordingjournal import RecordingJournal
+from recordingstore import RecordingStore
+from telemetry import TELEMETRY_INTERVAL, TelemetryReader
+from transmitter import CommandTransmitter
+from transport import list_ports, load_serial, open_transport
+
+# Legacy firmware never answers, so without a hello reply this is how long we
+# give it to come out of reset before sending anything.
+SETTLE_TIME = 1.0
+HELLO_INTERVAL = 0.1
+RECONNECT_DELAY = 0.05
+RECONNECT_MAX_DELAY = 1.0
+PROTOCOLS = ('auto', 'framed', 'legacy')
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+
+class TurretLink:
+    # One serial connection and its transmitter task. TurretCore drives one of
+    # these; TurretFleet drives many side by side.
+    def __init__(self, name=None, metrics=None, on_sent=None, listener=None, protocol='auto',
+                 auto_reconnect=True, scan=False, telemetry=TELEMETRY_INTERVAL):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown protocol '{protocol}', expected one of {', '.join(PROTOCOLS)}")
+        self.name = name
+        self.metrics = metrics or CommandMetrics()
+        self.on_sent = on_sent
+        self.listener = listener
+        self.protocol = protocol
+        self.auto_reconnect = auto_reconnect
+        self.scan = scan
+        self.telemetry = telemetry
+
+        self.port = None
+        self.timeout = 5
+        self.transport = None
+        self.transmitter = None
+        self.ready = None
+        self.reconnect_task = None
+        self.framed = False
+        self.encoder = None
+        self.estimator = TurretEstimator()
+        self.reader = None
+        self.status = None
+        self.frame_times = [None] * SEQ_MODULO
+        self.last_seq = None
+        self.overloaded = False
+        self.errors = 0
+        self.last_error = None
+        self.reconnects = 0
+
+    def emit(self, event, **data):
+        if self.listener:
+            self.listener(event, dict(data, turret=self.name))
+
+    @property
+    def is_connected(self):
+        return self.transport is not None
+
+    @property
+    def is_reconnecting(self):
+        return self.reconnect_task is not None
+
+    async def connect(self, port, timeout=5):
+        if self.is_connected:
+            raise RuntimeError(f"Already connected to {self.port}")
+        self.timeout = timeout
+        port, transport, framed = await self.discover(port, timeout)
+
+        self.port = port
+        self.transport = transport
+        self.framed = framed
+        self.encoder = protocol.FrameEncoder()
+        self.estimator.reset()
+        self.last_seq = None
+        self.status = None
+        self.ready = asyncio.Event()
+        self.ready.set()
+        self.transmitter = CommandTransmitter(self.write_transport, on_sent=self.on_sent,
+                                              on_error=self.transmit_failed, metrics=self.metrics,
+                                              encode=self.encode, coalesce=framed)
+        self.transmitter.start()
+        await self.start_telemetry()
+        self.emit('connected', port=port, protocol='framed' if framed else 'legacy')
+
+    async def open_ready(self, port, timeout):
+        transport = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: open_transport(port, timeout=timeout, nonblocking=True))
+        try:
+            framed = False
+            if self.protocol == 'legacy':
+                await asyncio.sleep(SETTLE_TIME)
+            else:
+                framed = await self.negotiate(transport)
+                if not framed and self.protocol == 'framed':
+                    raise ConnectionError(f"{port} did not answer the framed protocol handshake")
+        except BaseException:
+            transport.close()
+            raise
+        return transport, framed
+
+    async def negotiate(self, transport, timeout=SETTLE_TIME):
+        # The hello doubles as the readiness check: the sketch answers as soon as
+        # it is running, so a framed turret is usable within one round trip.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        reply = b''
+        while loop.time() < deadline:
+            await transport.write_async(protocol.hello())
+            probe_end = min(deadline, loop.time() + HELLO_INTERVAL)
+            while (remaining := probe_end - loop.time()) > 0:
+                try:
+                    reply += await asyncio.wait_for(transport.read_async(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if protocol.parse_hello(reply) is not None:
+                    return True
+                if not transport.is_open():
+                    return False
+        return False
+
+    async def discover(self, port, timeout):
+        # Tries port and, with scan on, every other serial port at once. The first
+        # one that answers the hello wins; port itself is the legacy fallback.
+        candidates = [port]
+        if self.scan and self.protocol != 'legacy':
+            candidates += [candidate for candidate in list_ports() if candidate != port]
+        if len(candidates) == 1:
+            return (port,) + await self.open_ready(port, timeout)
+
+        loop = asyncio.get_running_loop()
+        tasks = {loop.create_task(self.open_ready(candidate, timeout)): candidate for candidate in candidates}
+        pending = set(tasks)
+        found = None
+        fallback = None
+        error = None
+        try:
+            while pending and found is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        if tasks[task] == port:
+                            error = task.exception()
+                        continue
+                    transport, framed = task.result()
+                    if framed and found is None:
+                        found = (tasks[task], transport, True)
+                    elif tasks[task] == port:
+                        fallback = (port, transport, False)
+                    else:
+                        transport.close()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if found is not None:
+            if fallback is not None:
+                fallback[1].close()
+            return found
+        if fallback is not None:
+            return fallback
+        raise error or ConnectionError(f"No turret answered on {', '.join(candidates)}")
+
+    def encode(self, cmd):
+        # Filtering at send time rather than on enqueue keeps the estimate in step
+        # with what actually reaches the turret. Framed mode sends the estimator's
+        # targets as absolute positions.
+        cmd = self.estimator.apply(cmd)
+        if not cmd:
+            return b''
+        if not self.framed:
+            return cmd.encode()
+        target_ud, target_lr, spin_on = self.estimator.targets()
+        self.estimator.confirm()
+        self.last_seq = self.encoder.seq
+        self.frame_times[self.last_seq] = time.monotonic()
+        return self.encoder.encode(target_lr, target_ud, spin_on)
+
+    async def start_telemetry(self):
+        # Legacy firmware has no status frames, so there is nothing to read.
+        if not self.framed or not self.telemetry:
+            return
+        await self.transport.write_async(protocol.telemetry(self.telemetry * 1000))
+        self.reader = TelemetryReader(self.transport, self.status_received,
+                                      lambda e, transport=self.transport: self.read_failed(transport, e))
+        self.reader.start()
+
+    async def stop_telemetry(self):
+        if self.reader is not None:
+            reader, self.reader = self.reader, None
+            await reader.stop()
+
+    def status_received(self, status, received_at):
+        self.status = dict(status, received_at=received_at)
+        self.metrics.record_loop(status['loop_ms'] / 1000)
+        seq = status['seq']
+        if status['at_target'] and seq is not None:
+            sent_at, self.frame_times[seq] = self.frame_times[seq], None
+            if sent_at is not None:
+                self.metrics.record_motion(received_at - sent_at)
+        if status['at_target'] and seq == self.last_seq:
+            # Nothing newer is in flight, so the turret's word beats our estimate.
+            # Both are None before the first frame, which is how the position
+            # becomes known on connect.
+            self.estimator.sync(status['ud_pos'], status['lr_pos'], status['spin_on'])
+
+        # loop() steps the servos once more than updateDelay ms have passed; a
+        # slower pass means motion is falling behind the model.
+        overloaded = status['loop_ms'] > UPDATE_DELAY_MS
+        if overloaded and not self.overloaded:
+            self.emit('error', message=f"Turret loop took {status['loop_ms']} ms; servo updates are falling behind.")
+        self.overloaded = overloaded
+        self.emit('status', **self.status)
+
+    def read_failed(self, transport, e):
+        if self.auto_reconnect:
+            self.connection_lost(transport, e)
+        elif transport is self.transport:
+            self.transmit_failed(e)
+
+    async def write_transport(self, data):
+        # While reconnecting, writers wait here and the transmitter keeps queueing.
+        while True:
+            await self.ready.wait()
+            transport = self.transport
+            if transport is None:
+                raise ConnectionError("Not connected")
+            try:
+                await transport.write_async(data)
+                return
+            except Exception as e:
+                if not self.auto_reconnect:
+                    raise
+                self.connection_lost(transport, e)
+
+    def connection_lost(self, transport, e):
+        if transport is not self.transport or self.is_reconnecting:
+            return
+        self.errors += 1
+        self.last_error = str(e)
+        self.ready.clear()
+        if self.reader is not None:
+            self.reader.task.cancel()
+            self.reader = None
+        self.emit('reconnecting', port=self.port, message=f"Connection to {self.port} lost: {e}")
+        self.reconnect_task = asyncio.get_running_loop().create_task(self.reconnect(transport))
+
+    async def reconnect(self, old):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await loop.run_in_executor(None, old.close)
+        except Exception:
+            pass
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                port, transport, framed = await self.discover(self.port, self.timeout)
+                break
+            except Exception as e:
+                self.last_error = str(e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+        self.port = port
+        self.transport = transport
+        self.framed = framed
+        self.transmitter.coalesce = framed
+        # The estimate and last_seq are kept: a frame that failed to write was
+        # encoded from them and write_transport sends it again, so the status for
+        # it still syncs. The turret may have rebooted meanwhile, so nothing is
+        # suppressed until its position is confirmed again.
+        self.estimator.doubt()
+        self.reconnects += 1
+        self.reconnect_task = None
+        self.ready.set()
+        try:
+            await self.start_telemetry()
+        except Exception as e:
+            self.emit('error', message=f"Could not restart telemetry: {e}")
+        self.emit('reconnected', port=port, protocol='framed' if framed else 'legacy',
+                  downtime=loop.time() - started)
+
+    async def disconnect(self):
+        if not self.is_connected:
+            return
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            await asyncio.gather(self.reconnect_task, return_exceptions=True)
+            self.reconnect_task = None
+        transport, self.transport = self.transport, None
+        # Releases anyone waiting in write_transport; they find no transport and fail.
+        self.ready.set()
+        await self.stop_telemetry()
+        await self.transmitter.stop()
+        self.transmitter = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, transport.close)
+        except Exception as e:
+            self.emit('error', message=f"Error closing connection: {e}")
+        self.emit('disconnected', port=self.port)
+
+    def send_nowait(self, cmd, replace=False):
+        if not self.is_connected:
+            return False
+        return self.transmitter.send(cmd, replace)
+
+    async def send(self, cmd, timed=False):
+        # Returns once cmd is on the wire. Playback sends this way with timed on, so
+        # recordings share the queue with live input but keep their own timing.
+        if not self.is_connected:
+            return False
+        return await self.transmitter.send_wait(cmd, timed)
+
+    def transmit_failed(self, e):
+        self.errors += 1
+        self.last_error = str(e)
+        self.emit('error', message=f"Error sending command: {e}")
+        asyncio.get_running_loop().create_task(self.disconnect())
+
+
+class TurretCore:
+    def __init__(self, recordings_dir="recordings", metrics=None, listener=None, protocol='auto',
+                 auto_reconnect=True, scan=False):
+        self.recordings = RecordingStore(recordings_dir)
+        self.journal = RecordingJournal(recordings_dir)
+        self.metrics = metrics or CommandMetrics()
+        self.listener = listener
+        self.link = TurretLink(metrics=self.metrics, on_sent=self.command_sent, listener=listener,
+                               protocol=protocol, auto_reconnect=auto_reconnect, scan=scan)
+
+        self.playback = None
+        self.is_recording = False
+        self.journal_task = None
+        self.journal_wakeup = None
+
+    def emit(self, event, **data):
+        if self.listener:
+            self.listener(event, data)
+
+    @property
+    def is_connected(self):
+        return self.link.is_connected
+
+    @property
+    def transport(self):
+        return self.link.transport
+
+    async def connect(self, port, timeout=5):
+        await self.link.connect(port, timeout)
+
+    async def disconnect(self):
+        self.stop_playback()
+        await self.link.disconnect()
+
+    def send_nowait(self, cmd, replace=False):
+        return self.link.send_nowait(cmd, replace)
+
+    async def send(self, cmd):
+        return await self.link.send(cmd)
+
+    def command_sent(self, cmd, timestamp):
+        recorded_at = None
+        if self.is_recording:
+            recorded_at = self.journal.append(cmd, timestamp)
+            if self.journal.full():
+                self.journal_wakeup.set()
+        self.emit('sent', command=cmd, recorded_at=recorded_at)
+
+    async def start_recording(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.journal.start)
+        self.is_recording = True
+        self.journal_wakeup = asyncio.Event()
+        self.journal_task = loop.create_task(self.flush_journal())
+
+    async def stop_recording(self):
+        self.is_recording = False
+        if self.journal_task is not None:
+            self.journal_task.cancel()
+            self.journal_task = None
+        await asyncio.get_running_loop().run_in_executor(None, self.journal.close)
+        return len(self.journal)
+
+    async def flush_journal(self):
+        # The only place the journal touches the disk while recording, so a write
+        # or fsync never holds up the loop that sends the commands.
+        loop = asyncio.get_running_loop()
+        while self.is_recording:
+            try:
+                await asyncio.wait_for(self.journal_wakeup.wait(), JOURNAL_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.journal_wakeup.clear()
+            try:
+                await loop.run_in_executor(None, self.journal.flush)
+            except Exception as e:
+                self.emit('error', message=f"Error writing recording journal: {e}")
+
+    async def refresh_recordings(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.recordings.refresh)
+
+    async def load_serial_backend(self):
+        return await asyncio.get_running_loop().run_in_executor(None, load_serial)
+
+    async def save_recording(self, name):
+        count = len(self.journal)
+        if not count:
+            raise ValueError("Nothing to save. Recording is empty.")
+        await asyncio.get_running_loop().run_in_executor(None, self.finalize_journal, name)
+        return count
+
+    def finalize_journal(self, name):
+        self.recordings.save(name, self.journal.commands())
+        self.journal.discard()
+
+    async def recover_journal(self):
+        if not self.journal.has_data():
+            return None
+        name = time.strftime("Recovered %Y-%m-%d %H-%M-%S")
+        await asyncio.get_running_loop().run_in_executor(None, self.finalize_journal, name)
+        return name
+
+    async def record(self, name, duration):
+        await self.start_recording()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            await self.stop_recording()
+        return await self.save_recording(name)
+
+    async def play(self, recording, speed=1.0, loop=False):
+        if self.playback is not None:
+            raise RuntimeError("Already playing a recording.")
+        if isinstance(recording, str):
+            recording = await asyncio.get_running_loop().run_in_executor(None, self.recordings.load, recording)
+
+        self.playback = PlaybackEngine(
+            recording, partial(self.link.send, timed=True), speed=speed, loop=loop,
+            on_command=lambda cmd, lateness: self.emit('playback', command=cmd, lateness=lateness),
+            on_error=lambda e: self.emit('error', message=f"Playback error: {e}"),
+            metrics=self.metrics)
+        try:
+            return await self.playback.run()
+        finally:
+            self.playback = None
+
+    def stop_playback(self):
+        if self.playback is None:
+            return False
+        self.playback.stop()
+        return True
+
+    async def close(self):
+        if self.is_recording:
+            await self.stop_recording()
+        await self.disconnect()
+
+
+class CoreThread:
+    # Runs a TurretCore on its own event loop so that non-async clients such as
+    # the Tk GUI can drive it from their own thread.
+    def __init__(self, core):
+        self.core = core
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, func, *args):
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def stop(self, timeout=2.0):
+        try:
+            self.submit(self.core.close()).result(timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+
+
+def print_event(event, data):
+    if event == 'error':
+        print(data['message'])
+    elif event == 'connected':
+        print(f"Connected: {data['port']} ({data['protocol']} protocol)")
+    elif event == 'disconnected':
+        print(f"Disconnected: {data['port']}")
+    elif event == 'reconnecting':
+        print(f"{data['message']}, reconnecting")
+    elif event == 'reconnected':
+        print(f"Reconnected: {data['port']} after {data['downtime']:.2f} s")
+
+
+async def run_cli(args):
+    core = TurretCore(args.recordings_dir, listener=print_event, protocol=args.protocol,
+                      auto_reconnect=not args.no_reconnect, scan=args.scan)
+    await core.refresh_recordings()
+    await core.connect(args.port)
+    try:
+        if args.send:
+            await core.send(args.send)
+        for name in args.recordings:
+            stats = await core.play(name, speed=args.speed, loop=args.loop)
+            print(f"{name}: {stats['commands']} commands, mean lateness {stats['mean_lateness'] * 1000:.2f} ms, "
+                  f"max {stats['max_lateness'] * 1000:.2f} ms")
+    finally:
+        await core.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a bubble turret headlessly.")
+    parser.add_argument('port', help="serial port, or sim:// for a simulated turret")
+    parser.add_argument('recordings', nargs='*', help="names of recordings to play in order")
+    parser.add_argument('--send', help="commands to send before playback, e.g. 'c' to center")
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--loop', action='store_true', help="loop each recording until interrupted")
+    parser.add_argument('--recordings-dir', default="recordings")
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='auto',
+                        help="framed sends absolute targets; auto falls back to legacy if the turret does not answer")
+    parser.add_argument('--no-reconnect', action='store_true', help="give up on the first write error")
+    parser.add_argument('--scan', action='store_true', help="also look for the turret on every other serial port")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_cli(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
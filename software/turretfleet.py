@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import json
+import time
+
+from metrics import CommandMetrics
+from playback import PlaybackEngine
+from recordingstore import RecordingStore
+from turretcore import TurretLink, print_event
+
+MIRROR_PAN = str.maketrans('lr', 'rl')
+MIRROR_TILT = str.maketrans('ud', 'du')
+# Head start given to every turret so that all of them are waiting on the
+# shared start time before the first command is due.
+START_DELAY = 0.5
+
+
+class FleetMember:
+    def __init__(self, name, port, offset=0.0, mirror_pan=False, mirror_tilt=False, listener=None, protocol='auto'):
+        self.name = name
+        self.port = port
+        self.offset = offset
+        self.mirror_pan = mirror_pan
+        self.mirror_tilt = mirror_tilt
+        self.link = TurretLink(name, metrics=CommandMetrics(), listener=listener, protocol=protocol)
+        self.playback = None
+        self.last_stats = None
+
+    def translate(self, cmd):
+        if self.mirror_pan:
+            cmd = cmd.translate(MIRROR_PAN)
+        if self.mirror_tilt:
+            cmd = cmd.translate(MIRROR_TILT)
+        return cmd
+
+    async def send(self, cmd):
+        # Only playback sends this way; the recording sets the timing.
+        await self.link.send(self.translate(cmd), timed=True)
+
+    def health(self):
+        link = self.link
+        stats = link.metrics.snapshot()
+        return {
+            'port': self.port,
+            'connected': link.is_connected,
+            'protocol': ('framed' if link.framed else 'legacy') if link.is_connected else None,
+            'errors': link.errors,
+            'last_error': link.last_error,
+            'queue_depth': link.transmitter.pending() if link.transmitter else 0,
+            'bytes_per_second': stats['bytes_per_second'],
+            'latency_p95': stats['latency_p95'],
+            'playing': self.playback is not None,
+            'last_playback': self.last_stats,
+        }
+
+
+class TurretFleet:
+    def __init__(self, recordings_dir="recordings", listener=None):
+        self.recordings = RecordingStore(recordings_dir)
+        self.listener = listener
+        self.members = {}
+
+    @classmethod
+    def from_config(cls, path, recordings_dir="recordings", listener=None):
+        # The config is a JSON list of {"name", "port", "offset", "mirror_pan", "mirror_tilt", "protocol"}.
+        fleet = cls(recordings_dir, listener)
+        with open(path, 'r') as f:
+            for entry in json.load(f):
+                fleet.add(**entry)
+        return fleet
+
+    def add(self, name, port, offset=0.0, mirror_pan=False, mirror_tilt=False, protocol='auto'):
+        if name in self.members:
+            raise ValueError(f"Duplicate turret name '{name}'")
+        member = FleetMember(name, port, offset, mirror_pan, mirror_tilt, self.listener, protocol)
+        self.members[name] = member
+        return member
+
+    def emit_error(self, name, message):
+        if self.listener:
+            self.listener('error', {'turret': name, 'message': message})
+
+    def connected(self):
+        return [member for member in self.members.values() if member.link.is_connected]
+
+    async def connect(self, timeout=5):
+        members = [member for member in self.members.values() if not member.link.is_connected]
+        results = await asyncio.gather(*(member.link.connect(member.port, timeout) for member in members),
+                                       return_exceptions=True)
+        failures = {}
+        for member, result in zip(members, results):
+            if isinstance(result, Exception):
+                member.link.errors += 1
+                member.link.last_error = str(result)
+                failures[member.name] = result
+                self.emit_error(member.name, f"{member.name}: could not connect to {member.port}: {result}")
+        return failures
+
+    async def disconnect(self):
+        self.stop_playback()
+        await asyncio.gather(*(member.link.disconnect() for member in self.members.values()))
+
+    def broadcast(self, cmd):
+        return {member.name: member.link.send_nowait(member.translate(cmd)) for member in self.connected()}
+
+    async def play(self, recording, speed=1.0, loop=False, start_delay=START_DELAY):
+        if isinstance(recording, str):
+            recording = await asyncio.get_running_loop().run_in_executor(None, self.recordings.load, recording)
+
+        members = self.connected()
+        if not members:
+            raise RuntimeError("No turrets connected.")
+        # Every turret shares one monotonic start; negative offsets push it back so no one starts late.
+        start = time.monotonic() + start_delay - min(0.0, min(member.offset for member in members))
+
+        for member in members:
+            member.playback = PlaybackEngine(
+                recording, member.send, speed=speed, loop=loop, start_time=start + member.offset,
+                on_error=lambda e, name=member.name: self.emit_error(name, f"{name}: playback error: {e}"),
+                metrics=member.link.metrics)
+        try:
+            # Engines catch their own send errors, so one dead link cannot cancel the rest.
+            results = await asyncio.gather(*(member.playback.run() for member in members))
+        finally:
+            for member in members:
+                member.playback = None
+        for member, stats in zip(members, results):
+            member.last_stats = stats
+        return {member.name: stats for member, stats in zip(members, results)}
+
+    def stop_playback(self):
+        for member in self.members.values():
+            if member.playback is not None:
+                member.playback.stop()
+
+    def health(self):
+        return {name: member.health() for name, member in self.members.items()}
+
+    async def close(self):
+        await self.disconnect()
+
+
+async def report_health(fleet, interval):
+    while True:
+        await asyncio.sleep(interval)
+        for name, health in fleet.health().items():
+            state = "connected" if health['connected'] else "DOWN"
+            print(f"{name}: {state}, queue {health['queue_depth']}, {health['bytes_per_second']:.0f} B/s, "
+                  f"{health['errors']} errors")
+
+
+async def run_cli(args):
+    fleet = TurretFleet.from_config(args.config, args.recordings_dir, listener=print_event)
+    # The store only knows what is in its index until it has scanned the directory.
+    await asyncio.get_running_loop().run_in_executor(None, fleet.recordings.refresh)
+    await fleet.connect()
+    reporter = asyncio.get_running_loop().create_task(report_health(fleet, args.status_interval))
+    try:
+        if args.send:
+            fleet.broadcast(args.send)
+        for name in args.recordings:
+            results = await fleet.play(name, speed=args.speed, loop=args.loop)
+            for turret, stats in results.items():
+                print(f"{name} on {turret}: {stats['commands']} commands, "
+                      f"max lateness {stats['max_lateness'] * 1000:.2f} ms")
+    finally:
+        reporter.cancel()
+        await fleet.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive several bubble turrets in sync.")
+    parser.add_argument('config', help="JSON list of turrets: name, port, offset, mirror_pan, mirror_tilt, protocol")
+    parser.add_argument('recordings', nargs='*', help="names of recordings to play in order")
+    parser.add_argument('--send', help="commands to broadcast before playback")
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--status-interval', type=float, default=5.0, help="seconds between health reports")
+    parser.add_argument('--recordings-dir', default="recordings")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_cli(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import os
+import random
+import select
+import threading
+import time
+import tty
+from collections import deque
+
+from firmware import BYTES_PER_SECOND, UPDATE_INTERVAL, TurretModel
+from transport import LoopbackTransport
+
+
+class PtyLink:
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.closed = False
+
+    def receive(self, timeout=None):
+        readable, _, _ = select.select([self.master], [], [], timeout)
+        if not readable:
+            return None
+        return time.monotonic(), os.read(self.master, 1024)
+
+    def write(self, data):
+        return os.write(self.master, data)
+
+    def is_open(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class SimulatedTurret:
+    def __init__(self, link, bytes_per_second=BYTES_PER_SECOND, on_motion=None):
+        self.link = link
+        self.bytes_per_second = bytes_per_second
+        self.on_motion = on_motion
+        self.model = TurretModel(listener=self.record_motion)
+        self.pending = deque()
+        self.received = []
+        self.motion = []
+        self.line_free = 0
+        self.start_time = None
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(1.0)
+
+    def to_ms(self, t):
+        return int((t - self.start_time) * 1000)
+
+    def run(self):
+        while self.running and self.link.is_open():
+            timeout = UPDATE_INTERVAL
+            if self.pending:
+                timeout = max(0, min(timeout, self.pending[0][1] - time.monotonic()))
+            chunk = self.link.receive(timeout)
+            if chunk is not None:
+                sent_at, data = chunk
+                for byte in data:
+                    # Bytes leave the HC-05 one at a time at the link's baud rate.
+                    arrival = max(sent_at, self.line_free) + 1 / self.bytes_per_second
+                    self.line_free = arrival
+                    self.pending.append((sent_at, arrival, byte))
+            self.process(time.monotonic())
+
+    def process(self, now):
+        with self.lock:
+            while self.pending and self.pending[0][1] <= now:
+                sent_at, arrival, byte = self.pending.popleft()
+                self.model.advance(self.to_ms(arrival))
+                changed, reply = self.model.receive(byte)
+                if reply:
+                    self.reply(reply)
+                self.received.append((sent_at, arrival, byte, changed))
+            self.model.advance(self.to_ms(now))
+            status = self.model.poll_status(self.to_ms(now))
+            if status:
+                self.reply(status)
+
+    def reply(self, data):
+        try:
+            self.link.write(data)
+        except OSError:
+            # The controller hung up.
+            self.running = False
+
+    def record_motion(self, now_ms, ud_pos, lr_pos):
+        t = self.start_time + now_ms / 1000
+        self.motion.append((t, ud_pos, lr_pos))
+        if self.on_motion:
+            self.on_motion(t, ud_pos, lr_pos)
+
+    def report(self):
+        with self.lock:
+            received = list(self.received)
+            motion = list(self.motion)
+        if not received:
+            return {'bytes': 0}
+
+        link_latency = [arrival - sent_at for sent_at, arrival, _, _ in received]
+        motion_latency = []
+        i = 0
+        for sent_at, arrival, _, changed in received:
+            if not changed:
+                continue
+            while i < len(motion) and motion[i][0] < arrival:
+                i += 1
+            if i < len(motion):
+                motion_latency.append(motion[i][0] - sent_at)
+
+        span = max(received[-1][1] - received[0][0], 1e-9)
+        report = {
+            'bytes': len(received),
+            'state_changes': sum(1 for r in received if r[3]),
+            'bytes_per_second': len(received) / span,
+            'link_latency_mean': sum(link_latency) / len(link_latency),
+            'link_latency_max': max(link_latency),
+        }
+        if motion_latency:
+            report['motion_latency_mean'] = sum(motion_latency) / len(motion_latency)
+            report['motion_latency_max'] = max(motion_latency)
+        return report
+
+
+async def run_benchmark(count, interval):
+    from transmitter import CommandTransmitter
+    host, turret_end = LoopbackTransport.pair()
+    turret = SimulatedTurret(turret_end)
+    turret.start()
+    transmitter = CommandTransmitter(host.write_async)
+    transmitter.start()
+
+    rng = random.Random(0)
+    for _ in range(count):
+        transmitter.send(rng.choice('udlr'), replace=True)
+        await asyncio.sleep(interval)
+    await transmitter.drain()
+    await asyncio.sleep(0.5)
+
+    await transmitter.stop()
+    turret.stop()
+    host.close()
+    for key, value in turret.report().items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated bubble turret running the motorcontroller.ino model.")
+    parser.add_argument('--bench', type=int, metavar='N',
+                        help="send N random moves over an in-process loopback and report latency")
+    parser.add_argument('--interval', type=float, default=0.01, help="seconds between benchmark moves")
+    args = parser.parse_args()
+
+    if args.bench:
+        asyncio.run(run_benchmark(args.bench, args.interval))
+        return
+
+    link = PtyLink()
+    turret = SimulatedTurret(link, on_motion=lambda t, ud, lr: print(f"udPos={ud} lrPos={lr}"))
+    turret.start()
+    print(f"Simulated turret listening on {link.path}")
+    try:
+        while turret.thread.is_alive():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    turret.stop()
+    link.close()
+
+
+if __name__ == "__main__":
+    main()